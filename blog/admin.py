@@ -1,6 +1,7 @@
 from django.contrib import admin
 from django.utils import timezone
 
+from .cache import LIST_VERSION_KEY, bump_version, post_version_key
 from .models import BlogPost
 
 
@@ -14,6 +15,10 @@ class BlogPostAdmin(admin.ModelAdmin):
 
     def publish_posts(self, request, queryset):
         updated = queryset.update(published_at=timezone.now())
+        # update() не шлёт сигналы, поэтому страницы сбрасываем сами
+        bump_version(LIST_VERSION_KEY)
+        for pk in queryset.values_list("pk", flat=True):
+            bump_version(post_version_key(pk))
         self.message_user(request, f"{updated}  были успешно опубликованы.")
 
     publish_posts.short_description = "Опубликовать выбранные "
@@ -0,0 +1,52 @@
+from functools import wraps
+
+from django.core.cache import cache
+from django.views.decorators.cache import cache_page
+
+LIST_VERSION_KEY = "blog:list:version"
+
+
+def post_version_key(pk):
+    return f"blog:post:{pk}:version"
+
+
+def get_version(key):
+    version = cache.get(key)
+    if version is None:
+        version = 1
+        cache.add(key, version, None)
+    return version
+
+
+def bump_version(key):
+    # Старые страницы не удаляем: они просто перестают находиться и истекают сами
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.set(key, 2, None)
+
+
+def list_key_prefix(**kwargs):
+    return f"blog:list:{get_version(LIST_VERSION_KEY)}"
+
+
+def detail_key_prefix(pk, **kwargs):
+    return f"blog:post:{pk}:{get_version(post_version_key(pk))}"
+
+
+def versioned_cache_page(timeout, key_prefix):
+    """
+    cache_page, у которого префикс ключа вычисляется на каждый запрос из
+    аргументов вьюхи. Префикс включает версию, поэтому сбросить страницы
+    можно, увеличив версию, не трогая остальной кэш.
+    """
+
+    def decorator(view_func):
+        @wraps(view_func)
+        def wrapper(request, *args, **kwargs):
+            cached_view = cache_page(timeout, key_prefix=key_prefix(**kwargs))(view_func)
+            return cached_view(request, *args, **kwargs)
+
+        return wrapper
+
+    return decorator
@@ -0,0 +1,110 @@
+from functools import wraps
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Case, F, Value, When
+
+FLUSH_LOCK_KEY = "blog:views:flush"
+# Не даёт двум сбросам (по таймеру и командой) прочитать одни и те же счётчики
+FLUSH_RUNNING_KEY = "blog:views:flushing"
+FLUSH_RUNNING_TIMEOUT = 300
+# Журнал изменённых постов: счётчик записей и записи dirty:<n> с pk поста
+DIRTY_COUNT_KEY = "blog:views:dirty"
+# (до какой записи журнал разобран, сколько записей было при прошлом сбросе)
+DIRTY_FLUSHED_KEY = "blog:views:dirty:flushed"
+
+
+def view_count_key(pk):
+    return f"blog:views:{pk}"
+
+
+def dirty_key(n):
+    return f"blog:views:dirty:{n}"
+
+
+def mark_dirty(pk):
+    cache.add(DIRTY_COUNT_KEY, 0, None)
+    cache.set(dirty_key(cache.incr(DIRTY_COUNT_KEY)), pk, None)
+
+
+def record_view(pk):
+    """Считает просмотр в кэше; в базу накопленные просмотры пишет flush_views()."""
+    key = view_count_key(pk)
+    try:
+        count = cache.incr(key)
+    except ValueError:
+        count = 1 if cache.add(key, 1, None) else cache.incr(key)
+    # Пост попадает в журнал, когда его счётчик становится ненулевым
+    if count == 1:
+        mark_dirty(pk)
+
+
+def read_dirty_pks():
+    """
+    Возвращает pk постов из журнала и номер записи, до которой его можно
+    удалить. Запись, которой ещё нет (её номер выдан, а pk не записан),
+    ждёт следующего сброса; если её нет и тогда, процесс упал между
+    двумя операциями, и запись пропускается.
+    """
+    flushed, previous_total = cache.get(DIRTY_FLUSHED_KEY, (0, 0))
+    total = cache.get(DIRTY_COUNT_KEY, 0)
+    numbers = range(flushed + 1, total + 1)
+    entries = cache.get_many([dirty_key(n) for n in numbers])
+    missing = [n for n in numbers if dirty_key(n) not in entries and n > previous_total]
+    done = missing[0] - 1 if missing else total
+    return set(entries.values()), done, total
+
+
+def flush_views():
+    """
+    Переносит накопленные просмотры в базу одним UPDATE с F("views") + n.
+    Читаются только счётчики постов из журнала, а не вся таблица. Счётчики
+    уменьшаются ровно на записанное, так что просмотры, пришедшие во время
+    записи, дождутся следующего сброса. Возвращает число просмотров.
+    """
+    from .models import BlogPost
+
+    if not cache.add(FLUSH_RUNNING_KEY, 1, FLUSH_RUNNING_TIMEOUT):
+        return 0
+    try:
+        pks, done, total = read_dirty_pks()
+        counts = cache.get_many([view_count_key(pk) for pk in pks])
+        deltas = {pk: counts[view_count_key(pk)] for pk in pks if counts.get(view_count_key(pk))}
+        if deltas:
+            BlogPost.objects.filter(pk__in=deltas).update(
+                views=F("views")
+                + Case(*(When(pk=pk, then=Value(n)) for pk, n in deltas.items()), default=Value(0))
+            )
+        for pk, n in deltas.items():
+            # Пришедшие во время записи просмотры не вернули бы пост в журнал
+            if cache.decr(view_count_key(pk), n) > 0:
+                mark_dirty(pk)
+        flushed, _ = cache.get(DIRTY_FLUSHED_KEY, (0, 0))
+        cache.delete_many([dirty_key(n) for n in range(flushed + 1, done + 1)])
+        cache.set(DIRTY_FLUSHED_KEY, (done, total), None)
+        return sum(deltas.values())
+    finally:
+        cache.delete(FLUSH_RUNNING_KEY)
+
+
+def flush_views_if_due():
+    # add() удаётся одному процессу раз в BLOG_VIEWS_FLUSH_INTERVAL секунд
+    if cache.add(FLUSH_LOCK_KEY, 1, settings.BLOG_VIEWS_FLUSH_INTERVAL):
+        flush_views()
+
+
+def count_view(view_func):
+    """
+    Считает просмотры поста. Ставится снаружи кэширования страницы, чтобы
+    учитывались и ответы из кэша.
+    """
+
+    @wraps(view_func)
+    def wrapper(request, *args, **kwargs):
+        response = view_func(request, *args, **kwargs)
+        if response.status_code == 200:
+            record_view(kwargs["pk"])
+            flush_views_if_due()
+        return response
+
+    return wrapper
@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from blog.counters import flush_views
+
+
+class Command(BaseCommand):
+    help = "Write buffered blog post views to the database"
+
+    def handle(self, *args, **options):
+        flushed = flush_views()
+        self.stdout.write(self.style.SUCCESS(f"Views flushed: {flushed}"))
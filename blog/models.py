@@ -1,10 +1,11 @@
 from django.conf import settings
-from django.core.cache import cache
 from django.db import models
-from django.db.models.signals import post_delete, post_save
+from django.db.models.signals import post_delete, post_save, pre_save
 from django.dispatch import receiver
 from django.utils import timezone
 
+from .cache import LIST_VERSION_KEY, bump_version, post_version_key
+
 
 class BlogPost(models.Model):
     title = models.CharField(max_length=200)
@@ -28,6 +29,27 @@ class BlogPost(models.Model):
         ordering = ["-published_at"]
 
 
+def is_views_only(update_fields):
+    return update_fields is not None and set(update_fields) <= {"views"}
+
+
+@receiver(pre_save, sender=BlogPost)
+def remember_published(sender, instance, update_fields=None, **kwargs):
+    if instance.pk is None or is_views_only(update_fields):
+        instance._was_published = False
+        return
+    published_at = (
+        BlogPost.objects.filter(pk=instance.pk).values_list("published_at", flat=True).first()
+    )
+    instance._was_published = published_at is not None
+
+
 @receiver([post_save, post_delete], sender=BlogPost)
-def clear_blog_cache(sender, instance, **kwargs):
-    cache.clear()
+def clear_blog_cache(sender, instance, update_fields=None, **kwargs):
+    # Счётчик просмотров не повод сбрасывать страницы
+    if is_views_only(update_fields):
+        return
+    bump_version(post_version_key(instance.pk))
+    # Списки показывают только опубликованные посты
+    if instance.published_at is not None or getattr(instance, "_was_published", False):
+        bump_version(LIST_VERSION_KEY)
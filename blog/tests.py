@@ -1 +1,173 @@
-# Create your tests here.
+import io
+import tempfile
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache, caches
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from .cache import LIST_VERSION_KEY, get_version
+from .counters import (
+    DIRTY_COUNT_KEY,
+    DIRTY_FLUSHED_KEY,
+    FLUSH_LOCK_KEY,
+    FLUSH_RUNNING_KEY,
+    flush_views,
+    record_view,
+)
+from .models import BlogPost
+
+User = get_user_model()
+
+
+class BlogCacheTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.author = User.objects.create_user(
+            username="author", email="author@example.com", password="testpass123"
+        )
+        self.post = BlogPost.objects.create(
+            title="Первый пост", content="Текст", author=self.author, published_at=timezone.now()
+        )
+        self.other = BlogPost.objects.create(
+            title="Второй пост", content="Текст", author=self.author, published_at=timezone.now()
+        )
+
+    def detail(self, post):
+        return self.client.get(reverse("blog:post_detail", args=[post.pk]))
+
+    def test_view_count_does_not_invalidate_pages(self):
+        self.client.get(reverse("blog:post_list"))
+        self.detail(self.post)
+        self.detail(self.other)
+        with self.assertNumQueries(0):
+            self.client.get(reverse("blog:post_list"))
+            self.detail(self.other)
+
+    def test_edit_drops_only_its_own_detail_page(self):
+        self.detail(self.post)
+        self.detail(self.other)
+        self.post.title = "Исправленный пост"
+        self.post.save()
+        self.assertContains(self.detail(self.post), "Исправленный пост")
+        with self.assertNumQueries(0):
+            self.detail(self.other)
+
+    def test_edit_of_published_post_refreshes_list(self):
+        self.client.get(reverse("blog:post_list"))
+        self.post.title = "Исправленный пост"
+        self.post.save()
+        self.assertContains(self.client.get(reverse("blog:post_list")), "Исправленный пост")
+
+    def test_draft_edit_keeps_list_cached(self):
+        draft = BlogPost.objects.create(title="Черновик", content="Текст", author=self.author)
+        self.client.get(reverse("blog:post_list"))
+        draft.content = "Новый текст"
+        draft.save()
+        with self.assertNumQueries(0):
+            self.client.get(reverse("blog:post_list"))
+
+    def test_unpublish_refreshes_list(self):
+        self.client.get(reverse("blog:post_list"))
+        self.post.published_at = None
+        self.post.save()
+        self.assertNotContains(self.client.get(reverse("blog:post_list")), "Первый пост")
+
+
+class ViewCounterTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        author = User.objects.create_user(
+            username="author", email="author@example.com", password="testpass123"
+        )
+        self.post = BlogPost.objects.create(
+            title="Пост", content="Текст", author=author, published_at=timezone.now()
+        )
+        # Сброс по таймеру в тестах не нужен: вызываем flush_views() сами
+        cache.add(FLUSH_LOCK_KEY, 1, None)
+
+    def test_cached_hits_are_counted(self):
+        for _ in range(3):
+            self.client.get(reverse("blog:post_detail", args=[self.post.pk]))
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.views, 0)
+        self.assertEqual(flush_views(), 3)
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.views, 3)
+
+    def test_flush_applies_only_new_hits(self):
+        record_view(self.post.pk)
+        flush_views()
+        record_view(self.post.pk)
+        record_view(self.post.pk)
+        # Только UPDATE: какие посты изменились, известно из журнала в кэше
+        with self.assertNumQueries(1):
+            self.assertEqual(flush_views(), 2)
+        self.assertEqual(flush_views(), 0)
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.views, 3)
+
+    def test_concurrent_flush_is_skipped(self):
+        record_view(self.post.pk)
+        cache.add(FLUSH_RUNNING_KEY, 1)
+        self.assertEqual(flush_views(), 0)
+        call_command("flush_blog_views", stdout=io.StringIO())
+        cache.delete(FLUSH_RUNNING_KEY)
+        self.assertEqual(flush_views(), 1)
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.views, 1)
+
+    def test_unfinished_journal_entry_waits_one_flush(self):
+        # Номер записи выдан, а pk ещё не записан — как посреди record_view()
+        cache.add(DIRTY_COUNT_KEY, 0, None)
+        cache.incr(DIRTY_COUNT_KEY)
+        record_view(self.post.pk)
+        self.assertEqual(flush_views(), 1)
+        self.assertEqual(cache.get(DIRTY_FLUSHED_KEY), (0, 2))
+        self.assertEqual(flush_views(), 0)
+        self.assertEqual(cache.get(DIRTY_FLUSHED_KEY), (2, 2))
+
+    def test_missing_post_is_not_counted(self):
+        response = self.client.get(reverse("blog:post_detail", args=[self.post.pk + 1]))
+        self.assertEqual(response.status_code, 404)
+        self.assertEqual(flush_views(), 0)
+
+
+class SharedCacheTests(TestCase):
+    """Два экземпляра файлового кэша ведут себя как кэши двух воркеров."""
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+        shared_cache = {
+            "default": {
+                "BACKEND": "django.core.cache.backends.filebased.FileBasedCache",
+                "LOCATION": self.directory.name,
+                "KEY_PREFIX": "test",
+            }
+        }
+        settings_override = override_settings(CACHES=shared_cache)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        author = User.objects.create_user(
+            username="author", email="author@example.com", password="testpass123"
+        )
+        self.post = BlogPost.objects.create(
+            title="Пост", content="Текст", author=author, published_at=timezone.now()
+        )
+
+    def test_page_cached_by_one_worker_is_served_to_another(self):
+        self.client.get(reverse("blog:post_list"))
+        # Новое подключение к кэшу, как у другого воркера
+        del caches["default"]
+        with self.assertNumQueries(0):
+            self.client.get(reverse("blog:post_list"))
+
+    def test_invalidation_reaches_other_workers(self):
+        other_worker = caches.create_connection("default")
+        version = get_version(LIST_VERSION_KEY)
+        self.post.title = "Новый заголовок"
+        self.post.save()
+        self.assertEqual(other_worker.get(LIST_VERSION_KEY), version + 1)
@@ -1,11 +1,12 @@
 from django.utils.decorators import method_decorator
-from django.views.decorators.cache import cache_page
 from django.views.generic import DetailView, ListView
 
+from .cache import detail_key_prefix, list_key_prefix, versioned_cache_page
+from .counters import count_view
 from .models import BlogPost
 
 
-@method_decorator(cache_page(60 * 15), name="dispatch")
+@method_decorator(versioned_cache_page(60 * 15, list_key_prefix), name="dispatch")
 class BlogListView(ListView):
     model = BlogPost
     template_name = "blog/post_list.html"
@@ -16,15 +17,9 @@ class BlogListView(ListView):
         return BlogPost.objects.filter(published_at__isnull=False)
 
 
-@method_decorator(cache_page(60 * 15), name="dispatch")
+@method_decorator(count_view, name="dispatch")
+@method_decorator(versioned_cache_page(60 * 15, detail_key_prefix), name="dispatch")
 class BlogDetailView(DetailView):
     model = BlogPost
     template_name = "blog/post_detail.html"
     context_object_name = "post"
-
-    def get_object(self):
-        obj = super().get_object()
-        obj.views += 1
-        obj.save()
-        return obj
-        return obj
@@ -127,12 +127,68 @@ LANGUAGE_CODE = "en-us"
 
 
 TIME_ZONE = "Europe/Moscow"
-EMAIL_BACKEND = "django.core.mail.backends.smtp.EmailBackend"
+EMAIL_BACKEND = "mailpost.custom_email_backend.CustomEmailBackend"
 EMAIL_HOST = os.getenv("EMAIL_HOST")
 EMAIL_PORT = int(os.getenv("EMAIL_PORT"))
 EMAIL_USE_TLS = os.getenv("EMAIL_USE_TLS") == "True"
 EMAIL_HOST_USER = os.getenv("EMAIL_HOST_USER")
 EMAIL_HOST_PASSWORD = os.getenv("EMAIL_HOST_PASSWORD")
+# Пул SMTP-соединений CustomEmailBackend: сколько соединений хранить на один сервер,
+# сколько секунд соединение может простаивать и сколько писем через него отправлять
+EMAIL_POOL_SIZE = int(os.getenv("EMAIL_POOL_SIZE", 5))
+EMAIL_POOL_MAX_IDLE = int(os.getenv("EMAIL_POOL_MAX_IDLE", 120))
+EMAIL_POOL_MAX_MESSAGES = int(os.getenv("EMAIL_POOL_MAX_MESSAGES", 100))
+# Бэкенд для рассылок, например mailpost.async_email_backend.AsyncEmailBackend.
+# Если не задан, используется EMAIL_BACKEND
+MAILING_EMAIL_BACKEND = os.getenv("MAILING_EMAIL_BACKEND")
+# Сколько SMTP-сессий AsyncEmailBackend держит одновременно, всего и на один домен
+EMAIL_ASYNC_CONCURRENCY = int(os.getenv("EMAIL_ASYNC_CONCURRENCY", 10))
+EMAIL_ASYNC_PER_HOST_CONCURRENCY = int(os.getenv("EMAIL_ASYNC_PER_HOST_CONCURRENCY", 3))
+
+# Сколько писем рассылки собирается и отправляется за один проход через соединение
+MAILING_BATCH_SIZE = int(os.getenv("MAILING_BATCH_SIZE", 100))
+# Сколько получателей за раз читается из курсора базы при отправке рассылки
+MAILING_RECIPIENT_CHUNK_SIZE = int(os.getenv("MAILING_RECIPIENT_CHUNK_SIZE", 2000))
+# Лимиты скорости рассылок, писем в секунду (0 — без ограничения): на SMTP-relay
+# и на каждого владельца рассылок. MAILING_RELAY_RATES задаёт лимиты отдельных relay
+MAILING_RELAY_RATE = float(os.getenv("MAILING_RELAY_RATE", 0))
+MAILING_RELAY_RATES = {}
+MAILING_OWNER_RATE = float(os.getenv("MAILING_OWNER_RATE", 0))
+# Лимиты хранятся в общем кэше и действуют на все воркеры вместе (нужен memcached);
+# False — у каждого процесса свои лимиты. Окно общего лимита в секундах
+MAILING_THROTTLE_SHARED = os.getenv("MAILING_THROTTLE_SHARED", "True") == "True"
+MAILING_THROTTLE_WINDOW = float(os.getenv("MAILING_THROTTLE_WINDOW", 1))
+# Адрес сайта для ссылок в письмах, например на отписку
+SITE_URL = os.getenv("SITE_URL", "http://localhost:8000")
+# Сколько due-рассылок воркер забирает себе за один раз
+MAILING_CLAIM_BATCH_SIZE = int(os.getenv("MAILING_CLAIM_BATCH_SIZE", 50))
+# Повторная отправка писем после временных ошибок: первая задержка и её потолок
+# в секундах, максимум попыток и сколько повторов обрабатывается за один проход
+MAILING_RETRY_BASE_DELAY = int(os.getenv("MAILING_RETRY_BASE_DELAY", 60))
+MAILING_RETRY_MAX_DELAY = int(os.getenv("MAILING_RETRY_MAX_DELAY", 6 * 60 * 60))
+MAILING_RETRY_MAX_ATTEMPTS = int(os.getenv("MAILING_RETRY_MAX_ATTEMPTS", 5))
+MAILING_RETRY_BATCH_SIZE = int(os.getenv("MAILING_RETRY_BATCH_SIZE", 500))
+# Сколько писем outbox (подтверждение email и т. п.) отправляется за проход и как часто
+OUTBOX_BATCH_SIZE = int(os.getenv("OUTBOX_BATCH_SIZE", 100))
+OUTBOX_DRAIN_INTERVAL = int(os.getenv("OUTBOX_DRAIN_INTERVAL", 10))
+# Через сколько секунд письмо, взятое упавшим воркером, вернётся в очередь outbox
+OUTBOX_LEASE = int(os.getenv("OUTBOX_LEASE", 5 * 60))
+# Повторы outbox после временных ошибок: первая задержка, её потолок и максимум попыток
+OUTBOX_RETRY_BASE_DELAY = int(os.getenv("OUTBOX_RETRY_BASE_DELAY", 30))
+OUTBOX_RETRY_MAX_DELAY = int(os.getenv("OUTBOX_RETRY_MAX_DELAY", 15 * 60))
+OUTBOX_MAX_ATTEMPTS = int(os.getenv("OUTBOX_MAX_ATTEMPTS", 5))
+# Сколько записей журнала доставки вставляется одним INSERT
+MAILING_LOG_BATCH_SIZE = int(os.getenv("MAILING_LOG_BATCH_SIZE", 1000))
+
+# Если у владельца больше клиентов, форма рассылки предлагает только сегменты
+MAILING_FORM_MAX_CLIENTS = int(os.getenv("MAILING_FORM_MAX_CLIENTS", 500))
+
+# Импорт и экспорт клиентов в CSV: строк на пачку
+CLIENT_IMPORT_BATCH_SIZE = int(os.getenv("CLIENT_IMPORT_BATCH_SIZE", 1000))
+CLIENT_EXPORT_CHUNK_SIZE = int(os.getenv("CLIENT_EXPORT_CHUNK_SIZE", 2000))
+
+# Сколько секунд хранить в кэше собранное MIME-письмо сообщения
+MAILING_MIME_CACHE_TIMEOUT = int(os.getenv("MAILING_MIME_CACHE_TIMEOUT", 7 * 24 * 60 * 60))
 
 USE_I18N = True
 
@@ -168,9 +224,31 @@ MEDIA_ROOT = os.path.join(BASE_DIR, "media")
 
 DEFAULT_AUTO_FIELD = "django.db.models.BigAutoField"
 
+# Кэш: locmem — свой у каждого процесса; memcached и file — общий для всех воркеров,
+# поэтому страницы блога и их сброс видны всем процессам сразу
+CACHE_BACKENDS = {
+    "locmem": ("django.core.cache.backends.locmem.LocMemCache", "unique-snowflake"),
+    "memcached": ("django.core.cache.backends.memcached.PyMemcacheCache", "127.0.0.1:11211"),
+    "file": (
+        "django.core.cache.backends.filebased.FileBasedCache",
+        os.path.join(BASE_DIR, "cache"),
+    ),
+}
+CACHE_BACKEND, CACHE_DEFAULT_LOCATION = CACHE_BACKENDS[os.getenv("CACHE_BACKEND", "locmem")]
+
 CACHES = {
     "default": {
-        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
-        "LOCATION": "unique-snowflake",
+        "BACKEND": CACHE_BACKEND,
+        "LOCATION": os.getenv("CACHE_LOCATION", CACHE_DEFAULT_LOCATION),
+        "KEY_PREFIX": os.getenv("CACHE_KEY_PREFIX", "coursework6"),
     }
 }
+
+# Через сколько секунд счётчики главной страницы пересчитываются заново
+HOME_STATS_TIMEOUT = int(os.getenv("HOME_STATS_TIMEOUT", 15 * 60))
+
+# Как часто накопленные в кэше просмотры постов блога записываются в базу
+BLOG_VIEWS_FLUSH_INTERVAL = int(os.getenv("BLOG_VIEWS_FLUSH_INTERVAL", 60))
+
+# Сколько секунд помнить, состоит ли пользователь в группе Managers
+ROLE_CACHE_TIMEOUT = int(os.getenv("ROLE_CACHE_TIMEOUT", 300))
@@ -1,7 +1,18 @@
 from django.contrib import admin
 from django.contrib.auth.admin import UserAdmin
 
-from .models import Client, CustomUser, Mailing, MailingAttempt, Message
+from .models import (
+    Client,
+    CustomUser,
+    DeliveryRetry,
+    Mailing,
+    MailingAttempt,
+    MailingDelivery,
+    Message,
+    OutboxEmail,
+    Segment,
+    Suppression,
+)
 
 
 @admin.register(CustomUser)
@@ -30,6 +41,12 @@ class MessageAdmin(admin.ModelAdmin):
     search_fields = ("subject", "body")
 
 
+@admin.register(Segment)
+class SegmentAdmin(admin.ModelAdmin):
+    list_display = ("name", "owner")
+    list_filter = ("owner",)
+
+
 @admin.register(Mailing)
 class MailingAdmin(admin.ModelAdmin):
     list_display = ("start_datetime", "status", "owner")
@@ -48,3 +65,52 @@ class MailingAttemptAdmin(admin.ModelAdmin):
 
     def has_change_permission(self, request, obj=None):
         return False
+
+
+@admin.register(MailingDelivery)
+class MailingDeliveryAdmin(admin.ModelAdmin):
+    list_display = ("email", "attempt", "status", "smtp_code", "latency_ms")
+    list_filter = ("status", "smtp_code")
+    search_fields = ("email",)
+    readonly_fields = (
+        "attempt",
+        "client",
+        "email",
+        "status",
+        "smtp_code",
+        "server_response",
+        "latency_ms",
+        "throttle_wait_ms",
+    )
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+
+@admin.register(DeliveryRetry)
+class DeliveryRetryAdmin(admin.ModelAdmin):
+    list_display = ("email", "attempt", "attempts", "next_retry_at")
+    search_fields = ("email",)
+    readonly_fields = ("attempt", "client", "email", "attempts", "next_retry_at", "last_error")
+
+    def has_add_permission(self, request):
+        return False
+
+
+@admin.register(OutboxEmail)
+class OutboxEmailAdmin(admin.ModelAdmin):
+    list_display = ("subject", "recipient", "status", "attempts", "created_at", "sent_at")
+    list_filter = ("status",)
+    search_fields = ("recipient", "subject")
+    readonly_fields = ("attempts", "last_error", "created_at", "sent_at")
+
+
+@admin.register(Suppression)
+class SuppressionAdmin(admin.ModelAdmin):
+    list_display = ("email", "owner", "reason", "created_at")
+    list_filter = ("reason",)
+    search_fields = ("email",)
+    readonly_fields = ("server_response", "created_at")
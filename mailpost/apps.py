@@ -1,5 +1,4 @@
 from django.apps import AppConfig
-from time import sleep
 
 
 class MailingAppConfig(AppConfig):
@@ -7,7 +6,25 @@ class MailingAppConfig(AppConfig):
     name = "mailpost"
 
     def ready(self):
-        from .scheduler import start
+        from django.contrib.auth import get_user_model
+        from django.contrib.auth.models import Group
+        from django.db.models.signals import m2m_changed, post_delete, post_save
 
-        sleep(2)
-        start()
+        from blog.models import BlogPost
+
+        from . import stats
+        from .models import Client, Mailing
+        from .roles import bump_groups_version
+
+        # Кэш ролей сбрасывается при смене членства в группах и самих групп
+        m2m_changed.connect(bump_groups_version, sender=get_user_model().groups.through)
+        post_save.connect(bump_groups_version, sender=Group)
+        post_delete.connect(bump_groups_version, sender=Group)
+
+        # Счётчики главной страницы
+        post_save.connect(stats.mailing_saved, sender=Mailing)
+        post_delete.connect(stats.mailing_deleted, sender=Mailing)
+        post_save.connect(stats.clients_changed, sender=Client)
+        post_delete.connect(stats.clients_changed, sender=Client)
+        post_save.connect(stats.posts_changed, sender=BlogPost)
+        post_delete.connect(stats.posts_changed, sender=BlogPost)
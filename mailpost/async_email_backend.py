@@ -0,0 +1,203 @@
+import asyncio
+import time
+from collections import OrderedDict, defaultdict, deque
+
+import aiosmtplib
+from django.conf import settings
+from django.core.mail.backends.base import BaseEmailBackend
+from django.core.mail.message import sanitize_address
+
+
+class AsyncEmailBackend(BaseEmailBackend):
+    """
+    Бэкенд, который держит до concurrency SMTP-сессий одновременно.
+
+    Письма пачки раскладываются по очередям доменов получателей, и свободная
+    сессия берёт письмо из любого домена, у которого ещё не занято
+    per_host_concurrency сессий. Медленный домен поэтому не держит сессии,
+    пока другие домены ждут. Время отправки упирается в пропускную
+    способность сети, а не в задержку каждого SMTP-диалога. Открытые сессии
+    живут между вызовами, пока бэкенд открыт.
+    """
+
+    def __init__(
+        self,
+        host=None,
+        port=None,
+        username=None,
+        password=None,
+        use_tls=None,
+        use_ssl=None,
+        timeout=None,
+        concurrency=None,
+        per_host_concurrency=None,
+        fail_silently=False,
+        **kwargs,
+    ):
+        super().__init__(fail_silently=fail_silently)
+        self.host = host or settings.EMAIL_HOST
+        self.port = port or settings.EMAIL_PORT
+        self.username = settings.EMAIL_HOST_USER if username is None else username
+        self.password = settings.EMAIL_HOST_PASSWORD if password is None else password
+        self.use_tls = settings.EMAIL_USE_TLS if use_tls is None else use_tls
+        self.use_ssl = getattr(settings, "EMAIL_USE_SSL", False) if use_ssl is None else use_ssl
+        self.timeout = getattr(settings, "EMAIL_TIMEOUT", None) if timeout is None else timeout
+        self.concurrency = concurrency or settings.EMAIL_ASYNC_CONCURRENCY
+        self.per_host_concurrency = (
+            per_host_concurrency or settings.EMAIL_ASYNC_PER_HOST_CONCURRENCY
+        )
+        self.loop = None
+        self.idle_sessions = []
+
+    def open(self):
+        if self.loop is not None:
+            return False
+        self.loop = asyncio.new_event_loop()
+        return True
+
+    def close(self):
+        if self.loop is None:
+            return
+        try:
+            self.loop.run_until_complete(self._close_sessions())
+        finally:
+            self.loop.close()
+            self.loop = None
+
+    def send_messages(self, email_messages):
+        if not email_messages:
+            return 0
+        results = self.deliver(email_messages)
+        errors = [error for error, _ in results if error is not None]
+        if errors and not self.fail_silently:
+            raise errors[0]
+        return len(results) - len(errors)
+
+    def deliver(self, email_messages):
+        """
+        Отправляет письма параллельно. Возвращает для каждого письма пару
+        (исключение или None, время отправки в секундах) в исходном порядке.
+        """
+        new_loop_created = self.open()
+        try:
+            return self.loop.run_until_complete(self._deliver(email_messages))
+        finally:
+            if new_loop_created:
+                self.close()
+
+    async def _deliver(self, email_messages):
+        pending = OrderedDict()
+        for index, message in enumerate(email_messages):
+            domain = message.recipients()[0].rpartition("@")[2].lower()
+            pending.setdefault(domain, deque()).append((index, message))
+        scheduler = _DomainScheduler(pending, self.per_host_concurrency)
+        results = [None] * len(email_messages)
+        workers = min(self.concurrency, len(email_messages))
+        await asyncio.gather(*(self._worker(scheduler, results) for _ in range(workers)))
+        return results
+
+    async def _worker(self, scheduler, results):
+        session = None
+        try:
+            while True:
+                task = await scheduler.take()
+                if task is None:
+                    break
+                domain, index, message = task
+                started = time.monotonic()
+                try:
+                    if session is None:
+                        session = await self._get_session()
+                    await self._send(session, message)
+                    error = None
+                except Exception as e:
+                    error = self._unwrap_error(e)
+                    if isinstance(e, aiosmtplib.SMTPServerDisconnected):
+                        session = None
+                finally:
+                    await scheduler.release(domain)
+                results[index] = (error, time.monotonic() - started)
+        finally:
+            if session is not None:
+                self.idle_sessions.append(session)
+
+    async def _get_session(self):
+        if self.idle_sessions:
+            session = self.idle_sessions.pop()
+            if session.is_connected:
+                return session
+        session = aiosmtplib.SMTP(
+            hostname=self.host,
+            port=self.port,
+            username=self.username or None,
+            password=self.password or None,
+            use_tls=self.use_ssl,
+            start_tls=self.use_tls,
+            timeout=self.timeout,
+            local_hostname="localhost",
+        )
+        await session.connect()
+        return session
+
+    async def _send(self, session, message):
+        encoding = message.encoding or settings.DEFAULT_CHARSET
+        await session.sendmail(
+            sanitize_address(message.from_email, encoding),
+            [sanitize_address(address, encoding) for address in message.recipients()],
+            message.message().as_bytes(linesep="\r\n"),
+        )
+
+    async def _close_sessions(self):
+        sessions, self.idle_sessions = self.idle_sessions, []
+        for session in sessions:
+            try:
+                await session.quit()
+            except aiosmtplib.SMTPException:
+                session.close()
+
+    @staticmethod
+    def _unwrap_error(error):
+        # В письме один получатель, так что отказ получателя — это отказ письма
+        if isinstance(error, aiosmtplib.SMTPRecipientsRefused) and error.recipients:
+            return error.recipients[0]
+        return error
+
+
+class _DomainScheduler:
+    """
+    Раздаёт письма из очередей доменов, не превышая per_host_concurrency
+    одновременных отправок на домен.
+
+    Домены обходятся по кругу: взятый домен уходит в конец, так что быстрые
+    домены не отбирают сессии друг у друга. Сессия ждёт только тогда, когда
+    у каждого домена с письмами уже занят весь лимит.
+    """
+
+    def __init__(self, pending, per_host_concurrency):
+        self.pending = pending
+        self.per_host_concurrency = per_host_concurrency
+        self.active = defaultdict(int)
+        self.changed = asyncio.Condition()
+
+    async def take(self):
+        """Следующее письмо (domain, index, message) или None, если писем не осталось."""
+        async with self.changed:
+            while self.pending:
+                for domain, queue in self.pending.items():
+                    if self.active[domain] < self.per_host_concurrency:
+                        break
+                else:
+                    await self.changed.wait()
+                    continue
+                index, message = queue.popleft()
+                del self.pending[domain]
+                if queue:
+                    self.pending[domain] = queue
+                self.active[domain] += 1
+                return domain, index, message
+            return None
+
+    async def release(self, domain):
+        async with self.changed:
+            self.active[domain] -= 1
+            self.changed.notify_all()
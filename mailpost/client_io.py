@@ -0,0 +1,120 @@
+import csv
+import logging
+from dataclasses import dataclass, field
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.core.validators import validate_email
+
+from .dispatch import chunked
+from .models import Client, normalize_email
+from .stats import clients_changed
+
+logger = logging.getLogger(__name__)
+
+CSV_FIELDS = ["email", "full_name", "comment"]
+# Столько символов вмещает поле email клиента (RFC 5321)
+MAX_EMAIL_LENGTH = 254
+MAX_REPORTED_ERRORS = 100
+
+
+@dataclass
+class ImportResult:
+    created: int = 0
+    duplicates: int = 0
+    invalid: int = 0
+    errors: list = field(default_factory=list)
+
+    def add_error(self, line, message):
+        self.invalid += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append((line, message))
+
+
+def import_clients(owner, stream, batch_size=None):
+    """
+    Импортирует клиентов из CSV с колонками email, full_name, comment.
+
+    Файл читается построчно пачками по batch_size строк: на каждую пачку
+    один запрос уже существующих адресов владельца и один bulk_create,
+    так что память не зависит от размера файла (кроме множества адресов,
+    уже встреченных в самом файле).
+    """
+    batch_size = batch_size or settings.CLIENT_IMPORT_BATCH_SIZE
+    result = ImportResult()
+    reader = csv.DictReader(stream)
+    missing = {"email", "full_name"} - set(reader.fieldnames or [])
+    if missing:
+        result.add_error(1, f"Нет колонок: {', '.join(sorted(missing))}")
+        return result
+
+    seen = set()
+    # Первая строка — заголовок, поэтому данные начинаются со второй
+    for batch in chunked(enumerate(reader, start=2), batch_size):
+        candidates = {}
+        for line, row in batch:
+            email = (row.get("email") or "").strip()
+            full_name = (row.get("full_name") or "").strip()
+            try:
+                if len(email) > MAX_EMAIL_LENGTH:
+                    raise ValidationError("too long")
+                validate_email(email)
+            except ValidationError:
+                result.add_error(line, f"Неверный email: {email[:MAX_EMAIL_LENGTH]!r}")
+                continue
+            if not full_name:
+                result.add_error(line, "Не указано имя")
+                continue
+            key = normalize_email(email)
+            if key in seen or key in candidates:
+                result.duplicates += 1
+                continue
+            candidates[key] = Client(
+                email=email,
+                email_normalized=key,
+                full_name=full_name[:255],
+                comment=(row.get("comment") or "").strip(),
+                owner=owner,
+            )
+
+        # Проба уникального индекса (owner, email_normalized) вместо просмотра таблицы
+        existing = set(
+            Client.objects.filter(owner=owner, email_normalized__in=list(candidates)).values_list(
+                "email_normalized", flat=True
+            )
+        )
+        new_clients = [client for key, client in candidates.items() if key not in existing]
+        # Параллельный импорт мог успеть вставить те же адреса: такие строки пропускаются
+        Client.objects.bulk_create(new_clients, ignore_conflicts=True)
+        result.created += len(new_clients)
+        result.duplicates += len(candidates) - len(new_clients)
+        seen.update(candidates)
+
+    if result.created:
+        clients_changed(Client)
+    logger.info(
+        f"Imported clients for {owner}: {result.created} created, "
+        f"{result.duplicates} duplicates, {result.invalid} invalid"
+    )
+    return result
+
+
+class Echo:
+    """Псевдофайл для csv.writer: возвращает строку вместо записи."""
+
+    def write(self, value):
+        return value
+
+
+def export_rows(owner):
+    """Строки CSV с клиентами владельца; записи читаются из базы пачками."""
+    writer = csv.writer(Echo())
+    yield writer.writerow(CSV_FIELDS)
+    clients = (
+        Client.objects.filter(owner=owner)
+        .order_by("pk")
+        .values_list(*CSV_FIELDS)
+        .iterator(chunk_size=settings.CLIENT_EXPORT_CHUNK_SIZE)
+    )
+    for row in clients:
+        yield writer.writerow(row)
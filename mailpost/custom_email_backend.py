@@ -1,12 +1,121 @@
+import os
+import smtplib
+import threading
+import time
+from collections import defaultdict
+
+from django.conf import settings
 from django.core.mail.backends.smtp import EmailBackend
 
 
+class PooledConnection:
+    def __init__(self, connection):
+        self.connection = connection
+        self.messages_sent = 0
+        self.last_used = time.monotonic()
+
+
+class SMTPConnectionPool:
+    """
+    Общий на процесс пул авторизованных SMTP-соединений.
+
+    Соединение берётся из пула, только если оно пролежало без дела не
+    дольше max_idle секунд и отвечает на NOOP. Соединение, через которое
+    ушло max_messages писем, закрывается вместо возврата в пул.
+    """
+
+    def __init__(self, size=None, max_idle=None, max_messages=None):
+        self.size = settings.EMAIL_POOL_SIZE if size is None else size
+        self.max_idle = settings.EMAIL_POOL_MAX_IDLE if max_idle is None else max_idle
+        self.max_messages = (
+            settings.EMAIL_POOL_MAX_MESSAGES if max_messages is None else max_messages
+        )
+        self.lock = threading.Lock()
+        self.idle = defaultdict(list)
+
+    def acquire(self, key):
+        while True:
+            with self.lock:
+                if not self.idle[key]:
+                    return None
+                pooled = self.idle[key].pop()
+            if time.monotonic() - pooled.last_used <= self.max_idle and self._is_alive(pooled):
+                return pooled
+            self._quit(pooled)
+
+    def release(self, key, pooled):
+        pooled.last_used = time.monotonic()
+        if pooled.messages_sent < self.max_messages:
+            with self.lock:
+                if len(self.idle[key]) < self.size:
+                    self.idle[key].append(pooled)
+                    return
+        self._quit(pooled)
+
+    def clear(self):
+        with self.lock:
+            connections = [pooled for idle in self.idle.values() for pooled in idle]
+            self.idle.clear()
+        for pooled in connections:
+            self._quit(pooled)
+
+    def forget(self):
+        # После fork сокеты общие с родителем: бросаем их, не отправляя QUIT
+        self.lock = threading.Lock()
+        self.idle = defaultdict(list)
+
+    @staticmethod
+    def _is_alive(pooled):
+        try:
+            return pooled.connection.noop()[0] == 250
+        except (OSError, smtplib.SMTPException):
+            return False
+
+    @staticmethod
+    def _quit(pooled):
+        try:
+            pooled.connection.quit()
+        except (OSError, smtplib.SMTPException):
+            pooled.connection.close()
+
+
+connection_pool = None
+
+
+def get_connection_pool():
+    global connection_pool
+    if connection_pool is None:
+        connection_pool = SMTPConnectionPool()
+    return connection_pool
+
+
+def _forget_pool_in_child():
+    if connection_pool is not None:
+        connection_pool.forget()
+
+
+os.register_at_fork(after_in_child=_forget_pool_in_child)
+
+
 class CustomEmailBackend(EmailBackend):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.pooled = None
+
+    @property
+    def pool_key(self):
+        return (self.host, self.port, self.username, self.use_tls, self.use_ssl)
+
     # Переопределяем local_hostname
     def open(self):
         if self.connection:
             return False
 
+        self.pooled = get_connection_pool().acquire(self.pool_key)
+        if self.pooled is not None:
+            self.connection = self.pooled.connection
+            return True
+
         connection_params = {"local_hostname": "localhost"}  # Переопределяем local_hostname
         if self.timeout is not None:
             connection_params["timeout"] = self.timeout
@@ -19,7 +128,35 @@ class CustomEmailBackend(EmailBackend):
                 self.connection.starttls(context=self.ssl_context)
             if self.username and self.password:
                 self.connection.login(self.username, self.password)
+            self.pooled = PooledConnection(self.connection)
             return True
         except OSError:
             if not self.fail_silently:
                 raise
+
+    def close(self):
+        # Вместо QUIT возвращаем соединение в пул
+        if self.connection is None:
+            return
+        get_connection_pool().release(self.pool_key, self.pooled)
+        self.connection = None
+        self.pooled = None
+
+    def _replace_connection(self):
+        if self.pooled is not None:
+            SMTPConnectionPool._quit(self.pooled)
+        self.connection = None
+        self.pooled = None
+        self.open()
+
+    def _send(self, email_message):
+        # Соединение, открытое на всю рассылку, в пул не возвращается, поэтому
+        # лимит писем на соединение проверяется и здесь, а не только в release()
+        if self.pooled is None or self.pooled.messages_sent >= get_connection_pool().max_messages:
+            self._replace_connection()
+            if self.connection is None:
+                return False
+        sent = super()._send(email_message)
+        if sent:
+            self.pooled.messages_sent += 1
+        return sent
@@ -0,0 +1,189 @@
+import logging
+import random
+import smtplib
+import time
+from dataclasses import dataclass
+from datetime import timedelta
+from itertools import islice
+
+from django.conf import settings
+from django.core.mail import EmailMessage, get_connection
+
+from .mime import PrerenderedEmailMessage, get_mime_payload
+from .suppression import unsubscribe_url
+from .templating import MessageRenderer
+from .throttle import relay_name
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class DeliveryResult:
+    client_id: int | None
+    email: str
+    success: bool
+    smtp_code: int | None = None
+    response: str = ""
+    latency: float = 0.0
+    throttle_wait: float = 0.0
+
+
+def is_permanent_failure(result):
+    # 5xx — окончательный отказ; 4xx и сетевые ошибки без кода стоит повторить
+    return not result.success and result.smtp_code is not None and result.smtp_code >= 500
+
+
+def backoff_delay(attempts, base, maximum):
+    """Экспоненциальная задержка перед повтором с джиттером: от половины до полной."""
+    delay = min(base * 2 ** (attempts - 1), maximum)
+    return timedelta(seconds=delay / 2 + random.uniform(0, delay / 2))
+
+
+def chunked(iterable, size):
+    iterator = iter(iterable)
+    while batch := list(islice(iterator, size)):
+        yield batch
+
+
+def smtp_error_details(error):
+    """Достаёт SMTP-код и текст ответа сервера из исключения smtplib."""
+    if isinstance(error, smtplib.SMTPRecipientsRefused) and error.recipients:
+        code, response = next(iter(error.recipients.values()))
+    elif isinstance(error, smtplib.SMTPResponseException):
+        code, response = error.smtp_code, error.smtp_error
+    elif isinstance(getattr(error, "code", None), int):
+        # Исключения aiosmtplib хранят ответ сервера в code и message
+        code, response = error.code, error.message
+    else:
+        return None, str(error)
+    if isinstance(response, bytes):
+        response = response.decode("utf-8", "replace")
+    return code, response
+
+
+def iter_recipients(mailing, chunk_size=None):
+    """
+    Получатели рассылки кортежами (client_id, email, full_name).
+
+    Модели Client не создаются, а строки читаются курсором на стороне сервера
+    пачками по chunk_size, так что память воркера не растёт с размером аудитории.
+    """
+    chunk_size = chunk_size or settings.MAILING_RECIPIENT_CHUNK_SIZE
+    return (
+        mailing.get_recipients()
+        .values_list("pk", "email", "full_name")
+        .iterator(chunk_size=chunk_size)
+    )
+
+
+def unsubscribe_headers(url):
+    # RFC 8058: почтовый клиент может отписать получателя одним POST-запросом
+    return {"List-Unsubscribe": f"<{url}>", "List-Unsubscribe-Post": "List-Unsubscribe=One-Click"}
+
+
+def build_messages(mailing, recipients):
+    """
+    Разворачивает рассылку в отдельное письмо для каждого получателя.
+    Получатели — кортежи (client_id, email, full_name).
+    """
+    message = mailing.message
+    if not message.is_template and message.pk is not None:
+        # Письмо одинаково для всех: берём готовые байты и меняем только конверт
+        payload = get_mime_payload(message, settings.EMAIL_HOST_USER)
+        for client_id, email, _ in recipients:
+            yield client_id, PrerenderedEmailMessage(
+                payload,
+                subject=message.subject,
+                body=message.body,
+                from_email=settings.EMAIL_HOST_USER,
+                to=[email],
+                headers=unsubscribe_headers(unsubscribe_url(mailing.owner_id, email)),
+            )
+        return
+
+    renderer = MessageRenderer(message)
+    for client_id, email, full_name in recipients:
+        url = unsubscribe_url(mailing.owner_id, email)
+        subject, body = renderer.render(email, full_name, url)
+        yield client_id, EmailMessage(
+            subject=subject,
+            body=body,
+            from_email=settings.EMAIL_HOST_USER,
+            to=[email],
+            headers=unsubscribe_headers(url),
+        )
+
+
+def reconnect(connection):
+    # Соединение переоткрываем сами: send_messages() закрывает соединения,
+    # которые открыл он, и следующие письма шли бы каждое через новое
+    connection.close()
+    try:
+        connection.open()
+    except (OSError, smtplib.SMTPException) as e:
+        logger.warning(f"Failed to reconnect to SMTP server: {e}")
+
+
+def delivery_result(client_id, email, error, latency):
+    if error is None:
+        return DeliveryResult(client_id, email, True, 250, "OK", latency)
+    code, response = smtp_error_details(error)
+    logger.warning(f"Failed to send email to {email}: {response}")
+    return DeliveryResult(client_id, email, False, code, response, latency)
+
+
+def send_one(connection, client_id, message):
+    started = time.monotonic()
+    error = None
+    try:
+        connection.send_messages([message])
+    except Exception as e:
+        error = e
+        if isinstance(e, smtplib.SMTPServerDisconnected):
+            reconnect(connection)
+    return delivery_result(client_id, message.to[0], error, time.monotonic() - started)
+
+
+def send_batch(connection, batch):
+    if hasattr(connection, "deliver"):
+        # Бэкенд сам отправляет пачку параллельно и отчитывается по каждому письму
+        outcomes = connection.deliver([message for _, message in batch])
+        return [
+            delivery_result(client_id, message.to[0], error, latency)
+            for (client_id, message), (error, latency) in zip(batch, outcomes)
+        ]
+    # Письма уходят по одному через общее соединение: если отдать всю пачку в
+    # send_messages(), при ошибке не узнать, какие письма уже были отправлены.
+    return [send_one(connection, client_id, message) for client_id, message in batch]
+
+
+def dispatch_mailing(
+    mailing, recipients=None, connection=None, batch_size=None, throttle=None, suppressed=None
+):
+    """
+    Отправляет рассылку пачками по batch_size писем через одно SMTP-соединение.
+    Возвращает генератор списков DeliveryResult, по одному списку на пачку.
+    Если передан throttle, перед каждой пачкой ждёт квоты relay и владельца.
+    Получатели из suppressed (всё, что поддерживает `email in`) пропускаются.
+
+    Переданное соединение должно быть уже открыто: его жизнью управляет
+    вызывающий код, что позволяет отправить через него несколько рассылок.
+    """
+    batch_size = batch_size or settings.MAILING_BATCH_SIZE
+    if recipients is None:
+        recipients = iter_recipients(mailing)
+    if suppressed is not None:
+        recipients = (recipient for recipient in recipients if recipient[1] not in suppressed)
+
+    if connection is None:
+        with get_connection() as connection:
+            yield from dispatch_mailing(mailing, recipients, connection, batch_size, throttle)
+        return
+
+    relay = relay_name(connection)
+    for batch in chunked(build_messages(mailing, recipients), batch_size):
+        waited = throttle.acquire(relay, mailing.owner_id, len(batch)) if throttle else 0.0
+        results = send_batch(connection, batch)
+        for result in results:
+            result.throttle_wait = waited
+        yield results
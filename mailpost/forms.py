@@ -1,8 +1,12 @@
 from django import forms
+from django.conf import settings
 from django.contrib.auth import get_user_model
 from django.contrib.auth.forms import UserCreationForm
+from django.template import TemplateSyntaxError
+from django.utils import timezone
 
-from .models import Client, Mailing, Message
+from .models import Client, Mailing, Message, Segment, normalize_email
+from .templating import compile_template
 
 User = get_user_model()
 
@@ -31,12 +35,43 @@ class ClientForm(forms.ModelForm):
         model = Client
         exclude = ["owner"]
 
+    def clean_email(self):
+        email = self.cleaned_data["email"]
+        # Владельца проставляет вьюха; ограничение уникальности форма сама не проверит
+        if self.instance.owner_id is not None:
+            duplicates = Client.objects.filter(
+                owner_id=self.instance.owner_id, email_normalized=normalize_email(email)
+            ).exclude(pk=self.instance.pk)
+            if duplicates.exists():
+                raise forms.ValidationError("Клиент с таким email уже есть.")
+        return email
+
+
+class ClientImportForm(forms.Form):
+    file = forms.FileField(label="CSV-файл", help_text="Колонки: email, full_name, comment")
+
+
+class SegmentForm(forms.ModelForm):
+    class Meta:
+        model = Segment
+        exclude = ["owner"]
+
 
 class MessageForm(forms.ModelForm):
     class Meta:
         model = Message
         exclude = ["owner"]
 
+    def clean(self):
+        cleaned_data = super().clean()
+        if cleaned_data.get("is_template"):
+            for field in ("subject", "body"):
+                try:
+                    compile_template(cleaned_data.get(field, ""))
+                except TemplateSyntaxError as e:
+                    self.add_error(field, f"Ошибка в шаблоне: {e}")
+        return cleaned_data
+
 
 class MailingForm(forms.ModelForm):
     class Meta:
@@ -49,3 +84,31 @@ class MailingForm(forms.ModelForm):
         if user:
             self.fields["clients"].queryset = Client.objects.filter(owner=user)
             self.fields["message"].queryset = Message.objects.filter(owner=user)
+            self.fields["segment"].queryset = Segment.objects.filter(owner=user)
+            # Список из тысяч клиентов форму не сделает удобнее: большой аудитории — сегменты
+            if Client.objects.filter(owner=user).count() > settings.MAILING_FORM_MAX_CLIENTS:
+                del self.fields["clients"]
+
+    def clean(self):
+        cleaned_data = super().clean()
+        # Поле клиентов скрыто: отмеченные раньше клиенты остаются у рассылки
+        keeps_clients = (
+            "clients" not in self.fields and self.instance.pk and self.instance.clients.exists()
+        )
+        if (
+            not cleaned_data.get("segment")
+            and not cleaned_data.get("clients")
+            and not keeps_clients
+        ):
+            raise forms.ValidationError("Выберите сегмент или хотя бы одного клиента.")
+        return cleaned_data
+
+    def save(self, commit=True):
+        # Изменилось расписание уже существующей рассылки: пересчитываем следующий запуск
+        if self.instance.pk and {"start_datetime", "periodicity"} & set(self.changed_data):
+            if self.instance.mailingattempt_set.exists():
+                self.instance.next_run_at = self.instance.next_occurrence(timezone.now())
+            else:
+                # Ещё не отправлялась: первый запуск — само начало, даже если оно прошло
+                self.instance.next_run_at = self.instance.start_datetime
+        return super().save(commit)
@@ -0,0 +1,38 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from mailpost.models import Message
+from mailpost.templating import MessageRenderer
+
+
+class Command(BaseCommand):
+    help = "Measure per-recipient rendering cost of a template message"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--recipients", type=int, default=100_000, help="Number of recipients to render"
+        )
+
+    def handle(self, *args, **options):
+        count = options["recipients"]
+        message = Message(
+            subject="{{ full_name }}, новости недели",
+            body="Здравствуйте, {{ full_name }}!\n\nПисьмо отправлено на {{ email }}.\n" * 5,
+            is_template=True,
+        )
+
+        started = time.perf_counter()
+        renderer = MessageRenderer(message)
+        compiled = time.perf_counter() - started
+
+        started = time.perf_counter()
+        for i in range(count):
+            renderer.render(f"client{i}@example.com", f"Клиент {i}")
+        rendered = time.perf_counter() - started
+
+        self.stdout.write(f"Compile: {compiled * 1000:.2f} ms")
+        self.stdout.write(
+            f"Render: {count} recipients in {rendered:.2f} s, "
+            f"{rendered / count * 1_000_000:.1f} µs per recipient"
+        )
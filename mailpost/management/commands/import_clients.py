@@ -0,0 +1,39 @@
+import csv
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from mailpost.client_io import import_clients
+
+
+class Command(BaseCommand):
+    help = "Import clients of a user from a CSV file with email, full_name, comment columns"
+
+    def add_arguments(self, parser):
+        parser.add_argument("owner", help="Email of the user who will own the clients")
+        parser.add_argument("path", help="Path to the CSV file")
+        parser.add_argument("--batch-size", type=int, help="Rows per database batch")
+
+    def handle(self, *args, **options):
+        User = get_user_model()
+        try:
+            owner = User.objects.get(email=options["owner"])
+        except User.DoesNotExist:
+            raise CommandError(f"User {options['owner']} does not exist")
+
+        try:
+            with open(options["path"], newline="", encoding="utf-8-sig") as f:
+                with transaction.atomic():
+                    result = import_clients(owner, f, options["batch_size"])
+        except (UnicodeDecodeError, csv.Error) as e:
+            raise CommandError(f"Cannot read {options['path']}, nothing imported: {e}")
+
+        for line, error in result.errors:
+            self.stderr.write(f"Line {line}: {error}")
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Clients created: {result.created}, duplicates: {result.duplicates}, "
+                f"invalid: {result.invalid}"
+            )
+        )
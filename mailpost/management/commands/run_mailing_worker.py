@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+
+from mailpost.scheduler import start
+
+
+class Command(BaseCommand):
+    help = "Run the mailing worker: sends due mailings on a schedule"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--interval", type=int, default=60, help="Seconds between mailing checks"
+        )
+
+    def handle(self, *args, **options):
+        self.stdout.write(self.style.SUCCESS("Mailing worker started"))
+        start(options["interval"])
+        self.stdout.write("Mailing worker stopped")
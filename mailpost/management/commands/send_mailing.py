@@ -1,9 +1,26 @@
 from django.core.management.base import BaseCommand
+
+from mailpost.parallel import send_mailing_parallel
 from mailpost.tasks import send_mailing
 
 
 class Command(BaseCommand):
     help = "Send mailings"
 
-    def handle(self, *args, **kwargs):
-        send_mailing()
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--workers", type=int, default=1, help="Number of parallel mailing workers"
+        )
+        parser.add_argument(
+            "--executor",
+            choices=["process", "thread"],
+            default="process",
+            help="Run parallel workers as processes or threads",
+        )
+
+    def handle(self, *args, **options):
+        if options["workers"] > 1:
+            processed = send_mailing_parallel(options["workers"], options["executor"])
+        else:
+            processed = send_mailing()
+        self.stdout.write(self.style.SUCCESS(f"Mailings sent: {processed}"))
@@ -0,0 +1,32 @@
+# Generated by Django 5.1.15 on 2026-10-18 07:29
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('mailpost', '0002_alter_mailing_periodicity_alter_mailing_status'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='mailing',
+            name='status',
+            field=models.CharField(choices=[('created', 'Создано'), ('started', 'Запущено'), ('completed', 'Выполнено'), ('closed', 'Закрыто')], max_length=50),
+        ),
+        migrations.CreateModel(
+            name='MailingDelivery',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('email', models.EmailField(max_length=254)),
+                ('status', models.CharField(choices=[('success', 'Успешно'), ('failed', 'Не успешно')], max_length=50)),
+                ('smtp_code', models.PositiveSmallIntegerField(blank=True, null=True)),
+                ('server_response', models.TextField(blank=True)),
+                ('latency_ms', models.PositiveIntegerField(default=0)),
+                ('attempt', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='deliveries', to='mailpost.mailingattempt')),
+                ('client', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='deliveries', to='mailpost.client')),
+            ],
+        ),
+    ]
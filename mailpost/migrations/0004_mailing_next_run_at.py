@@ -0,0 +1,69 @@
+# Generated by Django 5.1.15 on 2026-10-18 07:31
+
+import calendar
+from datetime import timedelta
+
+from django.db import migrations, models
+from django.db.models import Max
+from django.utils import timezone
+
+INTERVALS = {
+    'every_5_minutes': timedelta(minutes=5),
+    'daily': timedelta(days=1),
+    'weekly': timedelta(days=7),
+}
+
+
+# Копии add_months() и Mailing.next_occurrence(): миграция не должна зависеть
+# от кода моделей, который может измениться позже
+def add_months(value, months):
+    month_index = value.month - 1 + months
+    year, month = value.year + month_index // 12, month_index % 12 + 1
+    day = min(value.day, calendar.monthrange(year, month)[1])
+    return value.replace(year=year, month=month, day=day)
+
+
+def next_occurrence(mailing, after):
+    start = timezone.localtime(mailing.start_datetime)
+    if after < start:
+        return start
+    if mailing.periodicity == 'monthly':
+        after = timezone.localtime(after)
+        months = (after.year - start.year) * 12 + after.month - start.month
+        candidate = add_months(start, months)
+        if candidate <= after:
+            candidate = add_months(start, months + 1)
+        return candidate
+    interval = INTERVALS[mailing.periodicity]
+    return start + interval * ((after - start) // interval + 1)
+
+
+def fill_next_run_at(apps, schema_editor):
+    Mailing = apps.get_model('mailpost', 'Mailing')
+    mailings = Mailing.objects.annotate(last_attempt=Max('mailingattempt__attempt_datetime'))
+    for mailing in mailings.iterator():
+        next_run_at = mailing.start_datetime
+        if mailing.last_attempt is not None:
+            # Следующий запуск по расписанию от start_datetime, как в Mailing.next_occurrence
+            next_run_at = next_occurrence(mailing, mailing.last_attempt)
+        Mailing.objects.filter(pk=mailing.pk).update(next_run_at=next_run_at)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('mailpost', '0003_alter_mailing_status_mailingdelivery'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='mailing',
+            name='next_run_at',
+            field=models.DateTimeField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='mailing',
+            index=models.Index(fields=['status', 'next_run_at'], name='mailing_due_idx'),
+        ),
+        migrations.RunPython(fill_next_run_at, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.1.15 on 2026-10-18 07:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('mailpost', '0004_mailing_next_run_at'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='mailingdelivery',
+            name='throttle_wait_ms',
+            field=models.PositiveIntegerField(default=0),
+        ),
+    ]
@@ -0,0 +1,26 @@
+# Generated by Django 5.1.15 on 2026-10-18 07:42
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('mailpost', '0005_mailingdelivery_throttle_wait_ms'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DeliveryRetry',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('email', models.EmailField(max_length=254)),
+                ('attempts', models.PositiveSmallIntegerField(default=1)),
+                ('next_retry_at', models.DateTimeField(db_index=True)),
+                ('last_error', models.TextField(blank=True)),
+                ('attempt', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='retries', to='mailpost.mailingattempt')),
+                ('client', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='retries', to='mailpost.client')),
+            ],
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.1.15 on 2026-10-18 07:46
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('mailpost', '0007_outboxemail'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='message',
+            name='is_template',
+            field=models.BooleanField(default=False, help_text='Тема и текст — шаблоны Django: {{ full_name }}, {{ email }}', verbose_name='Шаблон'),
+        ),
+    ]
@@ -0,0 +1,65 @@
+# Generated by Django 5.1.15 on 2026-10-18 08:20
+
+from django.db import migrations, models
+from django.db.models import Count, Min
+
+
+def collapse_duplicate_clients(apps, schema_editor):
+    Client = apps.get_model('mailpost', 'Client')
+    Mailing = apps.get_model('mailpost', 'Mailing')
+    MailingDelivery = apps.get_model('mailpost', 'MailingDelivery')
+    DeliveryRetry = apps.get_model('mailpost', 'DeliveryRetry')
+    MailingClients = Mailing.clients.through
+
+    clients = Client.objects.only('email').order_by('pk').iterator(chunk_size=2000)
+    batch = []
+    for client in clients:
+        client.email_normalized = client.email.strip().lower()
+        batch.append(client)
+        if len(batch) == 2000:
+            Client.objects.bulk_update(batch, ['email_normalized'])
+            batch = []
+    Client.objects.bulk_update(batch, ['email_normalized'])
+
+    # У каждой группы дубликатов остаётся самый старый клиент, ссылки переносятся на него
+    duplicates = (
+        Client.objects.values('owner_id', 'email_normalized')
+        .annotate(keep=Min('pk'), total=Count('pk'))
+        .filter(total__gt=1)
+    )
+    for group in duplicates.iterator():
+        keep = group['keep']
+        others = list(
+            Client.objects.filter(
+                owner_id=group['owner_id'], email_normalized=group['email_normalized']
+            )
+            .exclude(pk=keep)
+            .values_list('pk', flat=True)
+        )
+        linked = set(MailingClients.objects.filter(client_id=keep).values_list('mailing_id', flat=True))
+        for row in MailingClients.objects.filter(client_id__in=others):
+            if row.mailing_id in linked:
+                row.delete()
+            else:
+                linked.add(row.mailing_id)
+                MailingClients.objects.filter(pk=row.pk).update(client_id=keep)
+        MailingDelivery.objects.filter(client_id__in=others).update(client_id=keep)
+        DeliveryRetry.objects.filter(client_id__in=others).update(client_id=keep)
+        Client.objects.filter(pk__in=others).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('mailpost', '0010_owner_page_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='client',
+            name='email_normalized',
+            field=models.EmailField(default='', editable=False, max_length=254),
+            preserve_default=False,
+        ),
+        migrations.RunPython(collapse_duplicate_clients, migrations.RunPython.noop),
+    ]
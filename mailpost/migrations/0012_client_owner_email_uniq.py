@@ -0,0 +1,19 @@
+# Generated by Django 5.1.15 on 2026-10-18 08:20
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('mailpost', '0011_client_email_normalized'),
+    ]
+
+    operations = [
+        migrations.AddConstraint(
+            model_name='client',
+            constraint=models.UniqueConstraint(
+                fields=('owner', 'email_normalized'), name='client_owner_email_uniq'
+            ),
+        ),
+    ]
@@ -0,0 +1,34 @@
+# Generated by Django 5.1.15 on 2026-10-18 08:11
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('mailpost', '0012_client_owner_email_uniq'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='mailing',
+            name='clients',
+            field=models.ManyToManyField(blank=True, to='mailpost.client'),
+        ),
+        migrations.CreateModel(
+            name='Segment',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=255)),
+                ('rules', models.JSONField(blank=True, default=list, help_text='Например: [{"field": "email", "lookup": "iendswith", "value": "@gmail.com"}]')),
+                ('owner', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='segments', to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='mailing',
+            name='segment',
+            field=models.ForeignKey(blank=True, help_text='Если выбран сегмент, получатели определяются его правилами при отправке', null=True, on_delete=django.db.models.deletion.PROTECT, related_name='mailings', to='mailpost.segment'),
+        ),
+    ]
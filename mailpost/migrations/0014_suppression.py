@@ -0,0 +1,34 @@
+# Generated by Django 5.1.15 on 2026-10-18 08:18
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('mailpost', '0013_segment'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='message',
+            name='is_template',
+            field=models.BooleanField(default=False, help_text='Тема и текст — шаблоны Django: {{ full_name }}, {{ email }}, {{ unsubscribe_url }}', verbose_name='Шаблон'),
+        ),
+        migrations.CreateModel(
+            name='Suppression',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('email', models.EmailField(max_length=254)),
+                ('reason', models.CharField(choices=[('bounce', 'Отказ доставки'), ('unsubscribe', 'Отписка'), ('manual', 'Вручную')], default='manual', max_length=50)),
+                ('server_response', models.TextField(blank=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('owner', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='suppressions', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('owner', 'email'), name='suppression_owner_email_uniq'), models.UniqueConstraint(condition=models.Q(('owner__isnull', True)), fields=('email',), name='suppression_global_email_uniq')],
+            },
+        ),
+    ]
@@ -0,0 +1,72 @@
+from email.utils import formatdate
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.mail import EmailMessage
+from django.core.mail.message import make_msgid, sanitize_address
+from django.core.mail.utils import DNS_NAME
+
+
+def mime_cache_key(message):
+    return f"mailpost:mime:{message.pk}:{message.version}"
+
+
+def render_mime_payload(message, from_email):
+    """
+    Собирает MIME-письмо без заголовков конкретной отправки (To, Date,
+    Message-ID): тема, отправитель, кодировка и тело уже закодированы.
+    """
+    mime = EmailMessage(message.subject, message.body, from_email).message()
+    del mime["Date"]
+    del mime["Message-ID"]
+    return mime.as_bytes(linesep="\r\n")
+
+
+def get_mime_payload(message, from_email):
+    """
+    Возвращает готовые байты письма для сообщения-не-шаблона. Они живут в
+    кэше под ключом (сообщение, версия): правка сообщения меняет версию,
+    и следующая рассылка соберёт письмо заново.
+    """
+    key = mime_cache_key(message)
+    cached = cache.get(key)
+    if cached is not None and cached[0] == from_email:
+        return cached[1]
+    payload = render_mime_payload(message, from_email)
+    cache.set(key, (from_email, payload), settings.MAILING_MIME_CACHE_TIMEOUT)
+    return payload
+
+
+class PrerenderedMIME:
+    """Минимальная замена MIME-объекта, которой хватает почтовым бэкендам."""
+
+    def __init__(self, data):
+        self.data = data
+
+    def as_bytes(self, linesep="\n", **kwargs):
+        return self.data if linesep == "\r\n" else self.data.replace(b"\r\n", linesep.encode())
+
+    def get_charset(self):
+        return None
+
+
+class PrerenderedEmailMessage(EmailMessage):
+    """
+    Письмо, у которого от отправки к отправке меняются только To, Date,
+    Message-ID и заголовки из headers.
+    """
+
+    def __init__(self, payload, **kwargs):
+        super().__init__(**kwargs)
+        self.payload = payload
+
+    def message(self):
+        encoding = self.encoding or settings.DEFAULT_CHARSET
+        headers = (
+            f"To: {', '.join(sanitize_address(address, encoding) for address in self.to)}\r\n"
+            f"Date: {formatdate(localtime=settings.EMAIL_USE_LOCALTIME)}\r\n"
+            f"Message-ID: {make_msgid(domain=DNS_NAME)}\r\n"
+        )
+        # Заголовки получателя (List-Unsubscribe) ASCII-строки, кодировать их не нужно
+        headers += "".join(f"{name}: {value}\r\n" for name, value in self.extra_headers.items())
+        return PrerenderedMIME(headers.encode("ascii") + self.payload)
@@ -1,8 +1,12 @@
+import calendar
 import uuid
+from datetime import timedelta
 
 from django.conf import settings
 from django.contrib.auth.models import AbstractUser
+from django.core.exceptions import ValidationError
 from django.db import models
+from django.utils import timezone
 from django.utils.translation import gettext_lazy as _
 
 
@@ -10,22 +14,129 @@ def generate_verification_token():
     return uuid.uuid4().hex[:8]
 
 
+def add_months(value, months):
+    month_index = value.month - 1 + months
+    year, month = value.year + month_index // 12, month_index % 12 + 1
+    day = min(value.day, calendar.monthrange(year, month)[1])
+    return value.replace(year=year, month=month, day=day)
+
+
+def normalize_email(email):
+    return email.strip().lower()
+
+
 class Client(models.Model):
     email = models.EmailField()
+    # Адрес в нижнем регистре: по нему ищутся дубликаты у владельца
+    email_normalized = models.EmailField(editable=False)
     full_name = models.CharField(max_length=255)
     comment = models.TextField(blank=True, null=True)
     owner = models.ForeignKey(
         settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name="clients"
     )
 
+    class Meta:
+        # Для keyset-пагинации списка клиентов владельца
+        indexes = [models.Index(fields=["owner", "id"], name="client_owner_page_idx")]
+        constraints = [
+            models.UniqueConstraint(
+                fields=["owner", "email_normalized"], name="client_owner_email_uniq"
+            )
+        ]
+
+    def save(self, *args, **kwargs):
+        self.email_normalized = normalize_email(self.email)
+        super().save(*args, **kwargs)
+
+
+class Segment(models.Model):
+    """
+    Сохранённая аудитория: правила отбора клиентов владельца. Правила —
+    список условий {"field": ..., "lookup": ..., "value": ...}, которые
+    объединяются через И; "exclude": true превращает условие в исключение.
+    """
+
+    RULE_FIELDS = ["email", "full_name", "comment"]
+    RULE_LOOKUPS = [
+        "exact",
+        "iexact",
+        "contains",
+        "icontains",
+        "startswith",
+        "istartswith",
+        "endswith",
+        "iendswith",
+        "isnull",
+    ]
+
+    name = models.CharField(max_length=255)
+    rules = models.JSONField(
+        default=list,
+        blank=True,
+        help_text='Например: [{"field": "email", "lookup": "iendswith", "value": "@gmail.com"}]',
+    )
+    owner = models.ForeignKey(
+        settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name="segments"
+    )
+
+    def __str__(self):
+        return self.name
+
+    def clean(self):
+        if not isinstance(self.rules, list):
+            raise ValidationError({"rules": "Правила должны быть списком условий."})
+        for rule in self.rules:
+            if not isinstance(rule, dict) or "value" not in rule:
+                raise ValidationError({"rules": f"Неверное условие: {rule}"})
+            if rule.get("field") not in self.RULE_FIELDS:
+                raise ValidationError({"rules": f"Недопустимое поле: {rule.get('field')}"})
+            lookup = rule.get("lookup", "exact")
+            if lookup not in self.RULE_LOOKUPS:
+                raise ValidationError({"rules": f"Недопустимое условие: {lookup}"})
+            # Иначе ошибка всплыла бы в get_clients() при каждой отправке рассылки
+            value_type = bool if lookup == "isnull" else str
+            if not isinstance(rule["value"], value_type):
+                expected = "true или false" if value_type is bool else "строкой"
+                raise ValidationError({"rules": f"Значение для {lookup} должно быть {expected}"})
+            if not isinstance(rule.get("exclude", False), bool):
+                raise ValidationError({"rules": "exclude должно быть true или false"})
+
+    def get_clients(self):
+        """Клиенты сегмента одним запросом; правила проверены в clean()."""
+        clients = Client.objects.filter(owner_id=self.owner_id)
+        for rule in self.rules:
+            condition = {f"{rule['field']}__{rule.get('lookup', 'exact')}": rule["value"]}
+            if rule.get("exclude"):
+                clients = clients.exclude(**condition)
+            else:
+                clients = clients.filter(**condition)
+        return clients
+
 
 class Message(models.Model):
     subject = models.CharField(max_length=255)
     body = models.TextField()
+    is_template = models.BooleanField(
+        default=False,
+        verbose_name="Шаблон",
+        help_text=(
+            "Тема и текст — шаблоны Django: {{ full_name }}, {{ email }}, {{ unsubscribe_url }}"
+        ),
+    )
+    version = models.PositiveIntegerField(default=1, editable=False)
     owner = models.ForeignKey(
         settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name="messages"
     )
 
+    class Meta:
+        indexes = [models.Index(fields=["owner", "id"], name="message_owner_page_idx")]
+
+    def save(self, *args, **kwargs):
+        # Новая версия делает недействительным закэшированное MIME-письмо
+        if self.pk is not None:
+            self.version += 1
+        super().save(*args, **kwargs)
+
 
 class Mailing(models.Model):
     STATUS_CHOICES = [
@@ -46,10 +157,67 @@ class Mailing(models.Model):
     )
     status = models.CharField(max_length=50, choices=STATUS_CHOICES)
     message = models.ForeignKey(Message, on_delete=models.CASCADE)
-    clients = models.ManyToManyField(Client)
+    clients = models.ManyToManyField(Client, blank=True)
+    segment = models.ForeignKey(
+        Segment,
+        on_delete=models.PROTECT,
+        blank=True,
+        null=True,
+        related_name="mailings",
+        help_text="Если выбран сегмент, получатели определяются его правилами при отправке",
+    )
     owner = models.ForeignKey(
         settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name="mailings"
     )
+    next_run_at = models.DateTimeField(blank=True, null=True, editable=False)
+
+    ACTIVE_STATUSES = ["created", "started"]
+    PERIODICITY_INTERVALS = {
+        "every_5_minutes": timedelta(minutes=5),
+        "daily": timedelta(days=1),
+        "weekly": timedelta(days=7),
+    }
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["status", "next_run_at"], name="mailing_due_idx"),
+            models.Index(fields=["owner", "id"], name="mailing_owner_page_idx"),
+        ]
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Статус на момент загрузки: по нему статистика замечает смену статуса
+        if "status" in field_names:
+            instance._loaded_status = instance.status
+        return instance
+
+    def save(self, *args, **kwargs):
+        if self.next_run_at is None:
+            self.next_run_at = self.start_datetime
+        super().save(*args, **kwargs)
+
+    def get_recipients(self):
+        """Получатели рассылки: клиенты сегмента, а без него — отмеченные вручную."""
+        if self.segment_id is not None:
+            return self.segment.get_clients()
+        return self.clients.all()
+
+    def next_occurrence(self, after):
+        """Первый запуск по расписанию строго позже after."""
+        # Считаем в местном времени, чтобы «ежедневно в 10:00» не съезжало
+        start = timezone.localtime(self.start_datetime)
+        if after < start:
+            return start
+        if self.periodicity == "monthly":
+            after = timezone.localtime(after)
+            months = (after.year - start.year) * 12 + after.month - start.month
+            candidate = add_months(start, months)
+            if candidate <= after:
+                candidate = add_months(start, months + 1)
+            return candidate
+        interval = self.PERIODICITY_INTERVALS[self.periodicity]
+        return start + interval * ((after - start) // interval + 1)
 
 
 class MailingAttempt(models.Model):
@@ -67,6 +235,104 @@ class MailingAttempt(models.Model):
         return f"Попытка рассылки {self.mailing.id} - {self.status} - {self.attempt_datetime}"
 
 
+class MailingDelivery(models.Model):
+    STATUS_CHOICES = MailingAttempt.STATUS_CHOICES
+
+    attempt = models.ForeignKey(MailingAttempt, on_delete=models.CASCADE, related_name="deliveries")
+    client = models.ForeignKey(
+        Client, on_delete=models.SET_NULL, blank=True, null=True, related_name="deliveries"
+    )
+    email = models.EmailField()
+    status = models.CharField(max_length=50, choices=STATUS_CHOICES)
+    smtp_code = models.PositiveSmallIntegerField(blank=True, null=True)
+    server_response = models.TextField(blank=True)
+    latency_ms = models.PositiveIntegerField(default=0)
+    throttle_wait_ms = models.PositiveIntegerField(default=0)
+
+    def __str__(self):
+        return f"{self.email} - {self.status} ({self.smtp_code})"
+
+
+class DeliveryRetry(models.Model):
+    attempt = models.ForeignKey(MailingAttempt, on_delete=models.CASCADE, related_name="retries")
+    client = models.ForeignKey(Client, on_delete=models.CASCADE, related_name="retries")
+    email = models.EmailField()
+    attempts = models.PositiveSmallIntegerField(default=1)
+    next_retry_at = models.DateTimeField(db_index=True)
+    last_error = models.TextField(blank=True)
+
+    def __str__(self):
+        return f"Повтор {self.email} - попыток: {self.attempts}, следующая: {self.next_retry_at}"
+
+
+class OutboxEmail(models.Model):
+    STATUS_CHOICES = [
+        ("pending", "Ожидает отправки"),
+        ("sent", "Отправлено"),
+        ("failed", "Не отправлено"),
+    ]
+
+    subject = models.CharField(max_length=255)
+    body = models.TextField()
+    from_email = models.CharField(max_length=255, blank=True, null=True)
+    recipient = models.EmailField()
+    status = models.CharField(max_length=50, choices=STATUS_CHOICES, default="pending")
+    attempts = models.PositiveSmallIntegerField(default=0)
+    next_attempt_at = models.DateTimeField(default=timezone.now)
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    sent_at = models.DateTimeField(blank=True, null=True)
+
+    class Meta:
+        indexes = [models.Index(fields=["status", "next_attempt_at"], name="outbox_pending_idx")]
+
+    def __str__(self):
+        return f"{self.subject} -> {self.recipient} ({self.status})"
+
+
+class Suppression(models.Model):
+    """
+    Адрес, на который больше нельзя писать: получатель отписался или сервер
+    окончательно отказал в доставке. Без владельца запрет действует для всех.
+    """
+
+    REASON_CHOICES = [
+        ("bounce", "Отказ доставки"),
+        ("unsubscribe", "Отписка"),
+        ("manual", "Вручную"),
+    ]
+
+    email = models.EmailField()
+    owner = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        blank=True,
+        null=True,
+        related_name="suppressions",
+    )
+    reason = models.CharField(max_length=50, choices=REASON_CHOICES, default="manual")
+    server_response = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["owner", "email"], name="suppression_owner_email_uniq"),
+            # NULL в уникальном индексе не совпадает с NULL, поэтому глобальный — отдельно
+            models.UniqueConstraint(
+                fields=["email"],
+                condition=models.Q(owner__isnull=True),
+                name="suppression_global_email_uniq",
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.email} ({self.get_reason_display()})"
+
+    def save(self, *args, **kwargs):
+        self.email = normalize_email(self.email)
+        super().save(*args, **kwargs)
+
+
 class CustomUser(AbstractUser):
     email = models.EmailField(_("email address"), unique=True)
     is_verified = models.BooleanField(default=False)
@@ -79,3 +345,9 @@ class CustomUser(AbstractUser):
 
     def __str__(self):
         return self.email
+
+    @property
+    def is_manager(self):
+        from .roles import is_manager
+
+        return is_manager(self)
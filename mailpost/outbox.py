@@ -0,0 +1,81 @@
+import logging
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.mail import EmailMessage, get_connection
+from django.db import transaction
+from django.utils import timezone
+
+from .dispatch import backoff_delay, is_permanent_failure, send_one
+from .models import OutboxEmail
+
+logger = logging.getLogger(__name__)
+
+
+def enqueue_email(subject, body, recipient_list, from_email=None):
+    """
+    Кладёт письмо в outbox вместо отправки. Вызванная внутри транзакции,
+    запись появится только вместе с остальными изменениями этой транзакции.
+    """
+    return OutboxEmail.objects.bulk_create(
+        OutboxEmail(
+            subject=subject,
+            body=body,
+            from_email=from_email or settings.EMAIL_HOST_USER,
+            recipient=recipient,
+        )
+        for recipient in recipient_list
+    )
+
+
+def claim_outbox(current_datetime, limit):
+    with transaction.atomic():
+        emails = list(
+            OutboxEmail.objects.select_for_update(skip_locked=True)
+            .filter(status="pending", next_attempt_at__lte=current_datetime)
+            .order_by("next_attempt_at")[:limit]
+        )
+        # Пока письмо в работе, другие воркеры его не видят; если воркер упадёт,
+        # письмо вернётся в очередь через OUTBOX_LEASE секунд
+        lease = current_datetime + timedelta(seconds=settings.OUTBOX_LEASE)
+        OutboxEmail.objects.filter(pk__in=[email.pk for email in emails]).update(
+            next_attempt_at=lease
+        )
+    return emails
+
+
+def drain_outbox(connection=None, limit=None):
+    """Отправляет накопившиеся письма outbox. Возвращает число отправленных."""
+    current_datetime = timezone.now()
+    emails = claim_outbox(current_datetime, limit or settings.OUTBOX_BATCH_SIZE)
+    if not emails:
+        return 0
+    if connection is None:
+        with get_connection() as connection:
+            return send_outbox_emails(emails, connection, current_datetime)
+    return send_outbox_emails(emails, connection, current_datetime)
+
+
+def send_outbox_emails(emails, connection, current_datetime):
+    sent = 0
+    for email in emails:
+        message = EmailMessage(email.subject, email.body, email.from_email, [email.recipient])
+        result = send_one(connection, email.pk, message)
+        email.attempts += 1
+        if result.success:
+            email.status = "sent"
+            email.sent_at = timezone.now()
+            sent += 1
+        elif is_permanent_failure(result) or email.attempts >= settings.OUTBOX_MAX_ATTEMPTS:
+            email.status = "failed"
+            email.last_error = result.response
+        else:
+            email.next_attempt_at = current_datetime + backoff_delay(
+                email.attempts, settings.OUTBOX_RETRY_BASE_DELAY, settings.OUTBOX_RETRY_MAX_DELAY
+            )
+            email.last_error = result.response
+    OutboxEmail.objects.bulk_update(
+        emails, ["status", "attempts", "next_attempt_at", "last_error", "sent_at"]
+    )
+    logger.info(f"Outbox drained: {sent} of {len(emails)} emails sent")
+    return sent
@@ -0,0 +1,72 @@
+from django.http import Http404
+
+
+class CursorPage:
+    """
+    Страница keyset-пагинации. Вместо номера страницы ссылки несут pk
+    крайней записи, поэтому стоимость запроса не зависит от глубины.
+    """
+
+    def __init__(self, object_list, next_cursor=None, previous_cursor=None):
+        self.object_list = object_list
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def has_next(self):
+        return self.next_cursor is not None
+
+    def has_previous(self):
+        return self.previous_cursor is not None
+
+    def has_other_pages(self):
+        return self.has_next() or self.has_previous()
+
+
+def parse_cursor(value):
+    if value is None:
+        return None
+    try:
+        return int(value)
+    except ValueError:
+        raise Http404("Неверный курсор страницы")
+
+
+def paginate_keyset(request, queryset, per_page):
+    """
+    Возвращает страницу записей queryset от новых к старым по pk.
+    ?after=<pk> — следующая страница, ?before=<pk> — предыдущая.
+    """
+    after = parse_cursor(request.GET.get("after"))
+    before = parse_cursor(request.GET.get("before"))
+
+    if before is not None:
+        rows = list(queryset.filter(pk__gt=before).order_by("pk")[: per_page + 1])
+        has_more = len(rows) > per_page
+        rows = rows[:per_page][::-1]
+        next_cursor = rows[-1].pk if rows else None
+        previous_cursor = rows[0].pk if rows and has_more else None
+    else:
+        if after is not None:
+            queryset = queryset.filter(pk__lt=after)
+        rows = list(queryset.order_by("-pk")[: per_page + 1])
+        has_more = len(rows) > per_page
+        rows = rows[:per_page]
+        next_cursor = rows[-1].pk if rows and has_more else None
+        previous_cursor = rows[0].pk if rows and after is not None else None
+    return CursorPage(rows, next_cursor, previous_cursor)
+
+
+class KeysetPaginationMixin:
+    """Подменяет в ListView постраничный вывод по номеру на keyset-пагинацию."""
+
+    paginate_by = 25
+
+    def paginate_queryset(self, queryset, page_size):
+        page = paginate_keyset(self.request, queryset, page_size)
+        return None, page, page.object_list, page.has_other_pages()
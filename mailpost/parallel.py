@@ -0,0 +1,32 @@
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+import django
+from django.db import connections
+
+
+def run_shard(index, total):
+    # Модели импортируются только здесь: при spawn модуль грузится до django.setup()
+    from .tasks import send_mailing
+
+    try:
+        return send_mailing(shard=(index, total))
+    finally:
+        connections.close_all()
+
+
+def send_mailing_parallel(workers, executor="process"):
+    """
+    Делит due-рассылки на workers частей по хешу владельца и отправляет их
+    параллельно. У каждого воркера свои соединения с БД и SMTP-сервером.
+    Возвращает число обработанных рассылок.
+    """
+    if executor == "process":
+        # Дочерние процессы не должны делить с родителем открытые сокеты к БД
+        connections.close_all()
+        pool = ProcessPoolExecutor(max_workers=workers, initializer=django.setup)
+    else:
+        pool = ThreadPoolExecutor(max_workers=workers)
+
+    with pool:
+        futures = [pool.submit(run_shard, index, workers) for index in range(workers)]
+        return sum(future.result() for future in futures)
@@ -4,6 +4,8 @@ from django.contrib import messages
 from django.contrib.auth.mixins import UserPassesTestMixin
 from django.shortcuts import redirect
 
+from .roles import is_manager
+
 logger = logging.getLogger(__name__)
 
 
@@ -20,15 +22,26 @@ class VerifiedEmailRequiredMixin(UserPassesTestMixin):
         return redirect("home")
 
 
-class IsOwnerOrManagerMixin(UserPassesTestMixin):
+class SingleObjectCacheMixin:
+    """Запоминает объект, чтобы проверка прав и сама вьюха не загружали его дважды."""
+
+    def get_object(self, queryset=None):
+        if queryset is not None:
+            return super().get_object(queryset)
+        if not hasattr(self, "_object"):
+            self._object = super().get_object()
+        return self._object
+
+
+class IsOwnerOrManagerMixin(SingleObjectCacheMixin, UserPassesTestMixin):
     def test_func(self):
         obj = self.get_object()
-        is_owner = self.request.user == obj.owner
-        is_manager = self.request.user.groups.filter(name="Managers").exists()
-        logger.debug(f"User: {self.request.user}, Is owner: {is_owner}, Is manager: {is_manager}")
-        return is_owner or is_manager
+        is_owner = self.request.user.pk == obj.owner_id
+        manager = is_manager(self.request.user)
+        logger.debug(f"User: {self.request.user}, Is owner: {is_owner}, Is manager: {manager}")
+        return is_owner or manager
 
 
 class IsManagerMixin(UserPassesTestMixin):
     def test_func(self):
-        return self.request.user.groups.filter(name="Managers").exists()
+        return is_manager(self.request.user)
@@ -0,0 +1,39 @@
+from django.conf import settings
+from django.core.cache import cache
+
+MANAGERS_GROUP = "Managers"
+GROUPS_VERSION_KEY = "mailpost:roles:version"
+
+
+def groups_version():
+    version = cache.get(GROUPS_VERSION_KEY)
+    if version is None:
+        version = 1
+        cache.add(GROUPS_VERSION_KEY, version, None)
+    return version
+
+
+def bump_groups_version(**kwargs):
+    """Делает недействительными все закэшированные роли после изменения групп."""
+    try:
+        cache.incr(GROUPS_VERSION_KEY)
+    except ValueError:
+        cache.set(GROUPS_VERSION_KEY, 2, None)
+
+
+def is_manager(user):
+    """
+    Состоит ли пользователь в группе Managers. Ответ запоминается на объекте
+    пользователя до конца запроса и в кэше на ROLE_CACHE_TIMEOUT секунд;
+    ключ кэша включает версию групп, которую меняет любая правка членства.
+    """
+    if not user.is_authenticated:
+        return False
+    if not hasattr(user, "_is_manager"):
+        key = f"mailpost:roles:{user.pk}:{groups_version()}"
+        value = cache.get(key)
+        if value is None:
+            value = user.groups.filter(name=MANAGERS_GROUP).exists()
+            cache.set(key, value, settings.ROLE_CACHE_TIMEOUT)
+        user._is_manager = value
+    return user._is_manager
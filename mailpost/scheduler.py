@@ -1,12 +1,46 @@
-from apscheduler.schedulers.background import BackgroundScheduler
+from apscheduler.schedulers.blocking import BlockingScheduler
+from django.conf import settings
+from django.db import close_old_connections
+
+from .outbox import drain_outbox
 from .tasks import send_mailing
 
-scheduler = None
+
+def run_job(job):
+    # Задача живёт дольше любого запроса, поэтому соединения с БД обновляем сами
+    close_old_connections()
+    try:
+        job()
+    finally:
+        close_old_connections()
+
+
+def create_scheduler(interval=60):
+    scheduler = BlockingScheduler(timezone=settings.TIME_ZONE)
+    scheduler.add_job(
+        run_job,
+        "interval",
+        args=[send_mailing],
+        seconds=interval,
+        id="send_mailing",
+        max_instances=1,
+        coalesce=True,
+    )
+    scheduler.add_job(
+        run_job,
+        "interval",
+        args=[drain_outbox],
+        seconds=settings.OUTBOX_DRAIN_INTERVAL,
+        id="drain_outbox",
+        max_instances=1,
+        coalesce=True,
+    )
+    return scheduler
 
 
-def start():
-    global scheduler
-    if scheduler is None:
-        scheduler = BackgroundScheduler()
-        scheduler.add_job(send_mailing, "interval", minutes=1)
+def start(interval=60):
+    scheduler = create_scheduler(interval)
+    try:
         scheduler.start()
+    except (KeyboardInterrupt, SystemExit):
+        scheduler.shutdown(wait=False)
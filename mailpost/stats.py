@@ -0,0 +1,97 @@
+import random
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Count, Q
+
+from blog.models import BlogPost, is_views_only
+
+from .models import Client, Mailing
+
+TOTAL_MAILINGS_KEY = "mailpost:stats:total_mailings"
+ACTIVE_MAILINGS_KEY = "mailpost:stats:active_mailings"
+UNIQUE_CLIENTS_KEY = "mailpost:stats:unique_clients"
+POST_IDS_KEY = "mailpost:stats:post_ids"
+RANDOM_POSTS_COUNT = 3
+
+
+def compute_stats():
+    mailings = Mailing.objects.aggregate(
+        total=Count("pk"), active=Count("pk", filter=Q(status__in=Mailing.ACTIVE_STATUSES))
+    )
+    clients = Client.objects.aggregate(unique=Count("email_normalized", distinct=True))
+    return {
+        TOTAL_MAILINGS_KEY: mailings["total"],
+        ACTIVE_MAILINGS_KEY: mailings["active"],
+        UNIQUE_CLIENTS_KEY: clients["unique"],
+    }
+
+
+def get_home_stats():
+    """
+    Счётчики главной страницы. Между пересчётами их поддерживают сигналы,
+    а раз в HOME_STATS_TIMEOUT секунд ключи истекают и считаются заново,
+    так что накопившееся расхождение не живёт дольше этого срока.
+    """
+    keys = [TOTAL_MAILINGS_KEY, ACTIVE_MAILINGS_KEY, UNIQUE_CLIENTS_KEY]
+    stats = cache.get_many(keys)
+    if len(stats) < len(keys):
+        stats = compute_stats()
+        cache.set_many(stats, settings.HOME_STATS_TIMEOUT)
+    return {
+        "total_mailings": stats[TOTAL_MAILINGS_KEY],
+        "active_mailings": stats[ACTIVE_MAILINGS_KEY],
+        "unique_clients": stats[UNIQUE_CLIENTS_KEY],
+    }
+
+
+def adjust(key, delta):
+    if not delta:
+        return
+    try:
+        cache.incr(key, delta)
+    except ValueError:
+        # Счётчика нет в кэше: его посчитает заново следующий запрос
+        pass
+
+
+def get_random_posts(count=RANDOM_POSTS_COUNT):
+    """Случайные опубликованные посты: выбор из закэшированных id вместо ORDER BY random()."""
+    post_ids = cache.get(POST_IDS_KEY)
+    if post_ids is None:
+        post_ids = list(
+            BlogPost.objects.filter(published_at__isnull=False).values_list("pk", flat=True)
+        )
+        cache.set(POST_IDS_KEY, post_ids, settings.HOME_STATS_TIMEOUT)
+    chosen = random.sample(post_ids, min(count, len(post_ids)))
+    posts = BlogPost.objects.filter(pk__in=chosen).only("title", "content").in_bulk()
+    return [posts[pk] for pk in chosen if pk in posts]
+
+
+def mailing_saved(sender, instance, created, **kwargs):
+    is_active = instance.status in Mailing.ACTIVE_STATUSES
+    if created:
+        adjust(TOTAL_MAILINGS_KEY, 1)
+        adjust(ACTIVE_MAILINGS_KEY, int(is_active))
+    elif hasattr(instance, "_loaded_status"):
+        was_active = instance._loaded_status in Mailing.ACTIVE_STATUSES
+        adjust(ACTIVE_MAILINGS_KEY, int(is_active) - int(was_active))
+    else:
+        # Прежний статус неизвестен: пусть счётчик пересчитается
+        cache.delete(ACTIVE_MAILINGS_KEY)
+    instance._loaded_status = instance.status
+
+
+def mailing_deleted(sender, instance, **kwargs):
+    adjust(TOTAL_MAILINGS_KEY, -1)
+    adjust(ACTIVE_MAILINGS_KEY, -int(instance.status in Mailing.ACTIVE_STATUSES))
+
+
+def clients_changed(sender, **kwargs):
+    # COUNT(DISTINCT email) не поддержать приращениями, поэтому только сбрасываем
+    cache.delete(UNIQUE_CLIENTS_KEY)
+
+
+def posts_changed(sender, update_fields=None, **kwargs):
+    if not is_views_only(update_fields):
+        cache.delete(POST_IDS_KEY)
@@ -0,0 +1,83 @@
+from django.conf import settings
+from django.core import signing
+from django.urls import reverse
+
+from .models import Suppression, normalize_email
+
+UNSUBSCRIBE_SALT = "mailpost.unsubscribe"
+
+
+class SuppressionList:
+    """
+    Запрещённые адреса, загруженные в память на один проход отправки.
+
+    Глобальный список читается один раз, список владельца — при первой его
+    рассылке. Проверка адреса — два поиска в множестве, так что отфильтровать
+    даже большую аудиторию стоит миллисекунды.
+    """
+
+    def __init__(self):
+        self.global_emails = None
+        self.owner_emails = {}
+
+    def _load(self, owner_id):
+        emails = Suppression.objects.filter(owner_id=owner_id).values_list("email", flat=True)
+        return frozenset(emails)
+
+    def for_owner(self, owner_id):
+        if self.global_emails is None:
+            self.global_emails = self._load(None)
+        if owner_id not in self.owner_emails:
+            self.owner_emails[owner_id] = self._load(owner_id)
+        return OwnerSuppressions(self.global_emails, self.owner_emails[owner_id])
+
+
+class OwnerSuppressions:
+    """Запрещённые адреса для рассылок одного владельца; поддерживает `email in ...`."""
+
+    def __init__(self, global_emails, owner_emails):
+        self.global_emails = global_emails
+        self.owner_emails = owner_emails
+
+    def __contains__(self, email):
+        email = normalize_email(email)
+        return email in self.owner_emails or email in self.global_emails
+
+
+def bounce_suppression(owner_id, result):
+    """Запрет на адрес после окончательного отказа сервера (5xx)."""
+    return Suppression(
+        owner_id=owner_id,
+        email=normalize_email(result.email),
+        reason="bounce",
+        server_response=result.response,
+    )
+
+
+def save_suppressions(suppressions, batch_size=None):
+    # Адрес мог попасть в список раньше: такие строки просто пропускаются
+    Suppression.objects.bulk_create(suppressions, batch_size=batch_size, ignore_conflicts=True)
+
+
+def unsubscribe_token(owner_id, email):
+    return signing.dumps(
+        {"owner": owner_id, "email": normalize_email(email)}, salt=UNSUBSCRIBE_SALT
+    )
+
+
+def unsubscribe_url(owner_id, email):
+    """Абсолютная ссылка на отписку от рассылок владельца; подходит для писем."""
+    path = reverse("unsubscribe", args=[unsubscribe_token(owner_id, email)])
+    return f"{settings.SITE_URL.rstrip('/')}{path}"
+
+
+def read_unsubscribe_token(token):
+    """Возвращает (owner_id, email) или бросает signing.BadSignature."""
+    data = signing.loads(token, salt=UNSUBSCRIBE_SALT)
+    return data["owner"], data["email"]
+
+
+def add_unsubscribe(owner_id, email):
+    Suppression.objects.get_or_create(
+        owner_id=owner_id, email=normalize_email(email), defaults={"reason": "unsubscribe"}
+    )
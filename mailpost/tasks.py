@@ -1,50 +1,283 @@
 # tasks.py
 import logging
-from datetime import datetime
+from collections import defaultdict, deque
+from datetime import datetime, timedelta
 
 import pytz
 from django.conf import settings
-from django.core.mail import send_mail
+from django.core.mail import get_connection
+from django.db import transaction
+from django.db.models.functions import Mod
+from django.utils import timezone
 
-from .models import Mailing, MailingAttempt
+from .dispatch import backoff_delay, dispatch_mailing, is_permanent_failure
+from .models import DeliveryRetry, Mailing, MailingAttempt, MailingDelivery
+from .suppression import SuppressionList, bounce_suppression, save_suppressions
+from .throttle import get_throttle, relay_name
 
 logger = logging.getLogger(__name__)
 
 
-def send_mailing():
-    zone = pytz.timezone(settings.TIME_ZONE)
-    current_datetime = datetime.now(zone)
-    mailings = Mailing.objects.filter(start_datetime__lte=current_datetime).filter(
-        status__in=["created", "started"]
+def retry_delay(attempts):
+    return backoff_delay(
+        attempts, settings.MAILING_RETRY_BASE_DELAY, settings.MAILING_RETRY_MAX_DELAY
     )
 
-    for mailing in mailings:
-        last_attempt = (
-            MailingAttempt.objects.filter(mailing=mailing).order_by("-attempt_datetime").first()
+
+def is_retryable(result):
+    return not result.success and result.client_id is not None and not is_permanent_failure(result)
+
+
+class DeliveryLog:
+    """
+    Копит результаты отправки и пишет их в журнал доставки пачками.
+    Адреса с окончательным отказом попадают в список запрета владельца.
+    """
+
+    def __init__(self, attempt, chunk_size=None, enqueue_retries=True):
+        self.attempt = attempt
+        self.chunk_size = chunk_size or settings.MAILING_LOG_BATCH_SIZE
+        self.enqueue_retries = enqueue_retries
+        self.pending = []
+        self.retries = []
+        self.suppressions = []
+        self.sent = 0
+        self.failed = 0
+        self.throttle_wait = 0.0
+
+    def add(self, results):
+        for result in results:
+            if result.success:
+                self.sent += 1
+            else:
+                self.failed += 1
+            self.throttle_wait += result.throttle_wait
+            self.pending.append(
+                MailingDelivery(
+                    attempt=self.attempt,
+                    client_id=result.client_id,
+                    email=result.email,
+                    status="success" if result.success else "failed",
+                    smtp_code=result.smtp_code,
+                    server_response=result.response,
+                    latency_ms=round(result.latency * 1000),
+                    throttle_wait_ms=round(result.throttle_wait * 1000),
+                )
+            )
+            if self.enqueue_retries and is_retryable(result):
+                self.retries.append(
+                    DeliveryRetry(
+                        attempt=self.attempt,
+                        client_id=result.client_id,
+                        email=result.email,
+                        next_retry_at=timezone.now() + retry_delay(1),
+                        last_error=result.response,
+                    )
+                )
+            if is_permanent_failure(result):
+                self.suppressions.append(bounce_suppression(self.attempt.mailing.owner_id, result))
+        if len(self.pending) >= self.chunk_size:
+            self.flush()
+
+    def flush(self):
+        if self.pending:
+            MailingDelivery.objects.bulk_create(self.pending, batch_size=self.chunk_size)
+            self.pending = []
+        if self.retries:
+            DeliveryRetry.objects.bulk_create(self.retries, batch_size=self.chunk_size)
+            self.retries = []
+        if self.suppressions:
+            save_suppressions(self.suppressions, batch_size=self.chunk_size)
+            self.suppressions = []
+
+    def summary(self):
+        # throttle_wait — сумма ожиданий всех писем, в отчёт идёт среднее на письмо
+        average_wait = self.throttle_wait / max(self.sent + self.failed, 1)
+        return (
+            f"Отправлено: {self.sent}, ошибок: {self.failed}, "
+            f"среднее ожидание лимита отправки: {average_wait:.2f} с"
+        )
+
+
+def get_due_mailings(current_datetime):
+    """Рассылки, которым пора уходить: диапазонный проход по индексу (status, next_run_at)."""
+    # Получателей не подгружаем: их потоком читает dispatch_mailing при отправке
+    return Mailing.objects.filter(
+        status__in=Mailing.ACTIVE_STATUSES, next_run_at__lte=current_datetime
+    ).select_related("message")
+
+
+def claim_due_mailings(current_datetime, limit=None, shard=None):
+    """
+    Забирает пачку due-рассылок в работу этому процессу.
+
+    Строки блокируются через SELECT ... FOR UPDATE SKIP LOCKED, и в той же
+    транзакции next_run_at сдвигается на следующий запуск. Другие воркеры
+    пропускают заблокированные строки, а после коммита рассылка уже не due,
+    поэтому один и тот же запуск не уйдёт дважды.
+
+    shard — пара (номер, всего): воркер берёт только рассылки владельцев,
+    у которых owner_id % всего == номер.
+    """
+    limit = limit or settings.MAILING_CLAIM_BATCH_SIZE
+    mailings = get_due_mailings(current_datetime)
+    if shard is not None:
+        index, total = shard
+        mailings = mailings.annotate(shard=Mod("owner_id", total)).filter(shard=index)
+    with transaction.atomic():
+        mailings = mailings.select_for_update(skip_locked=True, of=("self",))
+        mailings = list(mailings.order_by("next_run_at")[:limit])
+        for mailing in mailings:
+            mailing.next_run_at = mailing.next_occurrence(current_datetime)
+        Mailing.objects.bulk_update(mailings, ["next_run_at"])
+    return mailings
+
+
+class MailingRun:
+    """Рассылка в процессе отправки: её пачки, попытка и журнал доставки."""
+
+    def __init__(self, mailing, connection=None, throttle=None, suppressed=None):
+        self.mailing = mailing
+        # Пока рассылка не завершена, попытка считается неуспешной
+        self.attempt = MailingAttempt.objects.create(mailing=mailing, status="failed")
+        self.delivery_log = DeliveryLog(self.attempt)
+        self.batches = dispatch_mailing(
+            mailing, connection=connection, throttle=throttle, suppressed=suppressed
         )
-        if last_attempt:
-            time_diff = current_datetime - last_attempt.attempt_datetime
-            if mailing.periodicity == "every_5_minutes" and time_diff.total_seconds() < 300:
-                continue
-            if mailing.periodicity == "daily" and time_diff.days < 1:
-                continue
-            elif mailing.periodicity == "weekly" and time_diff.days < 7:
-                continue
-            elif mailing.periodicity == "monthly" and time_diff.days < 30:
-                continue
+        self.error = None
 
+    def step(self):
+        """Отправляет следующую пачку. Возвращает False, когда отправлять больше нечего."""
         try:
-            server_response = send_mail(
-                subject=mailing.message.subject,
-                message=mailing.message.body,
-                from_email=settings.EMAIL_HOST_USER,
-                recipient_list=[client.email for client in mailing.clients.all()],
-                fail_silently=False,
-            )
-            logger.info(f"Email sent successfully. Server response: {server_response}")
-            MailingAttempt.objects.create(
-                mailing=mailing, status="success", server_response=server_response
-            )
+            self.delivery_log.add(next(self.batches))
+            return True
+        except StopIteration:
+            return False
         except Exception as e:
             logger.error(f"Failed to send email: {str(e)}")
-            MailingAttempt.objects.create(mailing=mailing, status="failed", server_response=str(e))
+            self.error = e
+            return False
+
+    def finish(self):
+        self.delivery_log.flush()
+        if self.error is not None:
+            self.attempt.server_response = str(self.error)
+        else:
+            self.attempt.server_response = self.delivery_log.summary()
+            if not self.delivery_log.failed:
+                self.attempt.status = "success"
+            logger.info(f"Mailing {self.mailing.id} dispatched. {self.attempt.server_response}")
+        self.attempt.save(update_fields=["status", "server_response"])
+        return self.attempt
+
+
+def run_fair(mailings, connection, throttle, suppressions=None):
+    """
+    Отправляет рассылки, чередуя пачки разных владельцев по кругу.
+
+    Ход получает владелец, которому меньше всех ждать своей квоты; при
+    равенстве — следующий по кругу. Поэтому владелец с огромной рассылкой
+    или исчерпанным лимитом не задерживает остальных.
+    """
+    suppressions = suppressions or SuppressionList()
+    runs = defaultdict(deque)
+    for mailing in mailings:
+        suppressed = suppressions.for_owner(mailing.owner_id)
+        runs[mailing.owner_id].append(MailingRun(mailing, connection, throttle, suppressed))
+    relay = relay_name(connection)
+    owners = deque(runs)
+    while owners:
+        owner_id = min(
+            owners,
+            key=lambda owner: throttle.delay(relay, owner, settings.MAILING_BATCH_SIZE),
+        )
+        owners.remove(owner_id)
+        owner_runs = runs[owner_id]
+        if not owner_runs[0].step():
+            owner_runs.popleft().finish()
+        if owner_runs:
+            owners.append(owner_id)
+
+
+def claim_due_retries(current_datetime, limit=None, shard=None):
+    """
+    Забирает пачку повторов, время которых пришло. Как и с рассылками,
+    строки блокируются с SKIP LOCKED, а next_retry_at сдвигается на
+    MAILING_RETRY_MAX_DELAY: если воркер упадёт, повтор вернётся в очередь.
+    """
+    limit = limit or settings.MAILING_RETRY_BATCH_SIZE
+    retries = DeliveryRetry.objects.filter(next_retry_at__lte=current_datetime)
+    if shard is not None:
+        index, total = shard
+        retries = retries.annotate(shard=Mod("attempt__mailing__owner_id", total)).filter(
+            shard=index
+        )
+    with transaction.atomic():
+        retries = retries.select_for_update(skip_locked=True, of=("self",))
+        retries = retries.select_related("attempt__mailing__message", "client")
+        retries = list(retries.order_by("next_retry_at")[:limit])
+        lease = current_datetime + timedelta(seconds=settings.MAILING_RETRY_MAX_DELAY)
+        DeliveryRetry.objects.filter(pk__in=[retry.pk for retry in retries]).update(
+            next_retry_at=lease
+        )
+    return retries
+
+
+def retry_failed_deliveries(
+    current_datetime, connection, throttle=None, shard=None, suppressions=None
+):
+    """
+    Повторно отправляет письма, не доставленные из-за временных ошибок.
+    Повторяются только сами неудачные получатели, а не вся рассылка;
+    адреса, попавшие с тех пор в список запрета, снимаются с повтора.
+    """
+    suppressions = suppressions or SuppressionList()
+    by_attempt = defaultdict(list)
+    for retry in claim_due_retries(current_datetime, shard=shard):
+        by_attempt[retry.attempt_id].append(retry)
+
+    finished, rescheduled = [], []
+    for retries in by_attempt.values():
+        attempt = retries[0].attempt
+        if attempt.mailing.status not in Mailing.ACTIVE_STATUSES:
+            finished.extend(retries)
+            continue
+        suppressed = suppressions.for_owner(attempt.mailing.owner_id)
+        finished.extend(retry for retry in retries if retry.email in suppressed)
+        retries = [retry for retry in retries if retry.email not in suppressed]
+        by_client = {retry.client_id: retry for retry in retries}
+        recipients = [(retry.client_id, retry.email, retry.client.full_name) for retry in retries]
+        delivery_log = DeliveryLog(attempt, enqueue_retries=False)
+        for results in dispatch_mailing(attempt.mailing, recipients, connection, throttle=throttle):
+            delivery_log.add(results)
+            for result in results:
+                retry = by_client[result.client_id]
+                if is_retryable(result) and retry.attempts < settings.MAILING_RETRY_MAX_ATTEMPTS:
+                    retry.attempts += 1
+                    retry.next_retry_at = current_datetime + retry_delay(retry.attempts)
+                    retry.last_error = result.response
+                    rescheduled.append(retry)
+                else:
+                    finished.append(retry)
+        delivery_log.flush()
+        logger.info(f"Retried deliveries of attempt {attempt.id}. {delivery_log.summary()}")
+
+    DeliveryRetry.objects.filter(pk__in=[retry.pk for retry in finished]).delete()
+    DeliveryRetry.objects.bulk_update(rescheduled, ["attempts", "next_retry_at", "last_error"])
+    return len(finished) + len(rescheduled)
+
+
+def send_mailing(shard=None):
+    zone = pytz.timezone(settings.TIME_ZONE)
+    current_datetime = datetime.now(zone)
+    processed = 0
+    # Список запрета загружается один раз на проход и общий для всех рассылок
+    suppressions = SuppressionList()
+
+    with get_connection(settings.MAILING_EMAIL_BACKEND) as connection:
+        while mailings := claim_due_mailings(current_datetime, shard=shard):
+            run_fair(mailings, connection, get_throttle(), suppressions)
+            processed += len(mailings)
+        # Повторы идут после свежих рассылок и ограничены пачкой на проход
+        retry_failed_deliveries(current_datetime, connection, get_throttle(), shard, suppressions)
+    return processed
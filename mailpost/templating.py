@@ -0,0 +1,41 @@
+from functools import lru_cache
+
+from django.template import Context, Engine
+
+# Письма уходят как text/plain, поэтому HTML-экранирование не нужно
+engine = Engine(autoescape=False)
+
+
+@lru_cache(maxsize=256)
+def compile_template(source):
+    """Разбирает шаблон один раз; ключ кэша — сам текст, так что правка сообщения его обходит."""
+    return engine.from_string(source)
+
+
+class MessageRenderer:
+    """
+    Тема и текст сообщения, подготовленные к отправке одной рассылки.
+
+    Шаблоны компилируются один раз в конструкторе, а render() для каждого
+    получателя только подставляет его данные. Обычное сообщение без
+    шаблона возвращается как есть.
+    """
+
+    def __init__(self, message):
+        self.subject = message.subject
+        self.body = message.body
+        self.is_template = message.is_template
+        if self.is_template:
+            self.subject_template = compile_template(message.subject)
+            self.body_template = compile_template(message.body)
+
+    def render(self, email, full_name="", unsubscribe_url=""):
+        if not self.is_template:
+            return self.subject, self.body
+        context = Context(
+            {"email": email, "full_name": full_name, "unsubscribe_url": unsubscribe_url},
+            autoescape=False,
+        )
+        subject = self.subject_template.render(context)
+        # Перевод строки в заголовке EmailMessage не пропустит
+        return " ".join(subject.split()), self.body_template.render(context)
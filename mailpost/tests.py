@@ -1,15 +1,61 @@
+import asyncio
+import io
+import smtplib
+import socket
+import time
+from datetime import datetime, timedelta
+from email import message_from_bytes
+from email.header import decode_header, make_header
+from unittest.mock import patch
+
+from aiosmtpd.controller import Controller
 from django.contrib.auth import get_user_model
 from django.contrib.auth.models import Group, Permission
 from django.contrib.contenttypes.models import ContentType
 from django.core import mail
-from django.test import Client, TestCase
+from django.core.cache import cache, caches
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.mail import EmailMessage
+from django.core.mail.backends import locmem
+from django.core.management import call_command
+from django.db import IntegrityError, connection
+from django.test import Client, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
 from django.utils import timezone
 
+from blog.models import BlogPost
 from mailpost.models import Client as MailClient
-from mailpost.models import Mailing, MailingAttempt, Message
+from mailpost.models import (
+    DeliveryRetry,
+    Mailing,
+    MailingAttempt,
+    MailingDelivery,
+    Message,
+    OutboxEmail,
+    Segment,
+    Suppression,
+)
 
-from .forms import ClientForm, MailingForm, MessageForm
+from .async_email_backend import AsyncEmailBackend
+from .client_io import import_clients
+from .custom_email_backend import CustomEmailBackend, SMTPConnectionPool
+from .dispatch import DeliveryResult, dispatch_mailing, iter_recipients
+from .forms import ClientForm, MailingForm, MessageForm, SegmentForm
+from .mime import render_mime_payload
+from .outbox import claim_outbox, drain_outbox, enqueue_email
+from .roles import is_manager
+from .stats import get_home_stats, get_random_posts
+from .suppression import SuppressionList, add_unsubscribe, unsubscribe_url
+from .tasks import (
+    claim_due_mailings,
+    get_due_mailings,
+    retry_delay,
+    retry_failed_deliveries,
+    run_fair,
+)
+from .templating import compile_template, engine
+from .throttle import SharedTokenBucket, Throttle, TokenBucket
 
 User = get_user_model()
 
@@ -110,6 +156,7 @@ class ModelTests(TestCase):
 
 class ViewTests(TestCase):
     def setUp(self):
+        cache.clear()
         self.client = Client()
         self.user = User.objects.create_user(
             username="testuser", email="test@example.com", password="testpass123"
@@ -169,6 +216,58 @@ class ViewTests(TestCase):
         self.assertEqual(response.status_code, 200)
         self.assertTemplateUsed(response, "mailing_list.html")
 
+    def create_mailings(self, count):
+        message = self.mailing.message
+        Mailing.objects.bulk_create(
+            Mailing(
+                start_datetime=timezone.now(),
+                periodicity="daily",
+                status="created",
+                message=message,
+                owner=self.user,
+            )
+            for _ in range(count)
+        )
+
+    def test_mailing_list_keyset_pages(self):
+        self.create_mailings(30)
+        first = self.client.get(reverse("mailing_list"))
+        first_page = first.context["page_obj"]
+        self.assertEqual(len(first_page), 25)
+        self.assertFalse(first_page.has_previous())
+
+        second = self.client.get(reverse("mailing_list"), {"after": first_page.next_cursor})
+        second_page = second.context["page_obj"]
+        self.assertEqual(len(second_page), 6)
+        self.assertFalse(second_page.has_next())
+        self.assertContains(second, f"?before={second_page.previous_cursor}")
+
+        back = self.client.get(reverse("mailing_list"), {"before": second_page.previous_cursor})
+        self.assertEqual(
+            [mailing.pk for mailing in back.context["mailings"]],
+            [mailing.pk for mailing in first_page],
+        )
+
+    def test_mailing_list_query_count_is_constant(self):
+        self.create_mailings(5)
+        self.client.get(reverse("mailing_list"))
+        # Сессия, пользователь и страница рассылок; роль берётся из кэша
+        with self.assertNumQueries(3):
+            self.client.get(reverse("mailing_list"))
+        self.create_mailings(50)
+        with self.assertNumQueries(3):
+            self.client.get(reverse("mailing_list"))
+
+    def test_detail_page_loads_mailing_once(self):
+        self.client.get(reverse("mailing_detail", args=[self.mailing.id]))
+        with self.assertNumQueries(3):
+            response = self.client.get(reverse("mailing_detail", args=[self.mailing.id]))
+        self.assertEqual(response.status_code, 200)
+
+    def test_invalid_cursor_returns_404(self):
+        response = self.client.get(reverse("mailing_list"), {"after": "abc"})
+        self.assertEqual(response.status_code, 404)
+
     def test_unverified_user_cannot_create_client(self):
         self.user.is_verified = False
         self.user.save()
@@ -205,6 +304,192 @@ class ViewTests(TestCase):
         self.assertEqual(response.status_code, 403)  # Forbidden
 
 
+class RoleTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(
+            username="testuser", email="test@example.com", password="testpass123"
+        )
+        self.group, _ = Group.objects.get_or_create(name="Managers")
+
+    def fresh_user(self):
+        # Новый объект, как в следующем запросе
+        return User.objects.get(pk=self.user.pk)
+
+    def test_role_is_cached_across_requests(self):
+        self.assertFalse(is_manager(self.fresh_user()))
+        user = self.fresh_user()
+        with self.assertNumQueries(0):
+            self.assertFalse(is_manager(user))
+            self.assertFalse(user.is_manager)
+
+    def test_group_change_invalidates_cached_role(self):
+        self.assertFalse(is_manager(self.fresh_user()))
+        self.user.groups.add(self.group)
+        self.assertTrue(is_manager(self.fresh_user()))
+        self.user.groups.remove(self.group)
+        self.assertFalse(is_manager(self.fresh_user()))
+
+
+class HomeStatsTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(
+            username="testuser", email="test@example.com", password="testpass123"
+        )
+        self.message = Message.objects.create(subject="Тема", body="Текст", owner=self.user)
+        other = User.objects.create_user(
+            username="other", email="other@example.com", password="testpass123"
+        )
+        # Один и тот же адрес у двух владельцев — один уникальный клиент
+        for email, owner in [
+            ("a@example.com", self.user),
+            ("A@example.com", other),
+            ("b@example.com", self.user),
+        ]:
+            MailClient.objects.create(email=email, full_name="Клиент", owner=owner)
+        self.mailing = self.create_mailing("created")
+        self.create_mailing("completed")
+        for i in range(5):
+            BlogPost.objects.create(
+                title=f"Пост {i}", content="Текст", author=self.user, published_at=timezone.now()
+            )
+        BlogPost.objects.create(title="Черновик", content="Текст", author=self.user)
+
+    def create_mailing(self, status):
+        return Mailing.objects.create(
+            start_datetime=timezone.now(),
+            periodicity="daily",
+            status=status,
+            message=self.message,
+            owner=self.user,
+        )
+
+    def test_home_shows_stats_and_random_posts(self):
+        response = self.client.get(reverse("home"))
+        self.assertEqual(response.context["total_mailings"], 2)
+        self.assertEqual(response.context["active_mailings"], 1)
+        self.assertEqual(response.context["unique_clients"], 2)
+        posts = response.context["random_posts"]
+        self.assertEqual(len(posts), 3)
+        self.assertNotIn("Черновик", [post.title for post in posts])
+
+    def test_counters_follow_mailing_changes_without_recount(self):
+        get_home_stats()
+        self.create_mailing("started")
+        mailing = Mailing.objects.get(pk=self.mailing.pk)
+        mailing.status = "closed"
+        mailing.save()
+        with self.assertNumQueries(0):
+            stats = get_home_stats()
+        self.assertEqual((stats["total_mailings"], stats["active_mailings"]), (3, 1))
+        self.mailing.delete()
+        self.assertEqual(get_home_stats()["total_mailings"], 2)
+
+    def test_random_posts_use_cached_ids(self):
+        get_random_posts()
+        with self.assertNumQueries(1):
+            get_random_posts()
+
+
+class ClientImportExportTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(
+            username="testuser", email="test@example.com", password="testpass123"
+        )
+        self.user.is_verified = True
+        self.user.save()
+        MailClient.objects.create(email="old@example.com", full_name="Старый", owner=self.user)
+
+    def test_import_deduplicates_and_reports_invalid_rows(self):
+        data = (
+            "email,full_name,comment\n"
+            "new@example.com,Новый,\n"
+            "OLD@example.com,Старый,повтор из базы\n"
+            "new@example.com,Новый,повтор из файла\n"
+            "not-an-email,Ошибка,\n"
+            "other@example.com,Другой,коммент\n"
+        )
+        result = import_clients(self.user, io.StringIO(data), batch_size=2)
+        self.assertEqual((result.created, result.duplicates, result.invalid), (2, 2, 1))
+        self.assertEqual(result.errors[0][0], 5)
+        self.assertEqual(MailClient.objects.filter(owner=self.user).count(), 3)
+
+    def test_import_rejects_long_email_and_empty_name(self):
+        data = (
+            "email,full_name,comment\n"
+            f"{'a' * 64}@{'b' * 63}.{'c' * 63}.{'d' * 60}.com,Длинный,\n"
+            "noname@example.com,  ,\n"
+            "ok@example.com,Нормальный,\n"
+        )
+        result = import_clients(self.user, io.StringIO(data))
+        self.assertEqual((result.created, result.invalid), (1, 2))
+        self.assertEqual([line for line, _ in result.errors], [2, 3])
+        self.assertFalse(MailClient.objects.filter(email="noname@example.com").exists())
+
+    def test_duplicate_client_is_rejected_by_form(self):
+        self.client.login(email="test@example.com", password="testpass123")
+        response = self.client.post(
+            reverse("client_create"), {"email": " Old@Example.com", "full_name": "Дубль"}
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(MailClient.objects.filter(owner=self.user).count(), 1)
+
+    def test_email_is_unique_per_owner(self):
+        other = User.objects.create_user(
+            username="other", email="other@example.com", password="testpass123"
+        )
+        MailClient.objects.create(email="OLD@example.com", full_name="Чужой", owner=other)
+        with self.assertRaises(IntegrityError):
+            MailClient.objects.create(email="OLD@example.com", full_name="Дубль", owner=self.user)
+
+    def test_import_queries_per_batch(self):
+        rows = "".join(f"client{i}@example.com,Клиент {i},\n" for i in range(10))
+        with self.assertNumQueries(4):
+            import_clients(self.user, io.StringIO("email,full_name,comment\n" + rows), 5)
+
+    def test_import_view(self):
+        self.client.login(email="test@example.com", password="testpass123")
+        upload = SimpleUploadedFile(
+            "clients.csv", "email,full_name\nnew@example.com,Новый\n".encode(), "text/csv"
+        )
+        response = self.client.post(reverse("client_import"), {"file": upload})
+        self.assertRedirects(response, reverse("client_list"))
+        self.assertTrue(MailClient.objects.filter(email="new@example.com").exists())
+
+    def test_import_view_keeps_line_breaks_in_quoted_fields(self):
+        self.client.login(email="test@example.com", password="testpass123")
+        content = 'email,full_name,comment\r\nnew@example.com,Новый,"первая\r\nвторая"\r\n'
+        upload = SimpleUploadedFile("clients.csv", content.encode(), "text/csv")
+        self.client.post(reverse("client_import"), {"file": upload})
+        client = MailClient.objects.get(email="new@example.com")
+        self.assertEqual(client.comment, "первая\r\nвторая")
+
+    def test_import_view_rejects_unreadable_file(self):
+        self.client.login(email="test@example.com", password="testpass123")
+        rows = "".join(f"client{i}@example.com,Клиент {i}\n" for i in range(5))
+        for content in [
+            ("email,full_name\n" + rows).encode("cp1251"),
+            # Поле длиннее csv.field_size_limit() — csv.Error посреди файла
+            ("email,full_name\n" + rows + "x@example.com," + "x" * 200_000 + "\n").encode(),
+        ]:
+            upload = SimpleUploadedFile("clients.csv", content, "text/csv")
+            with self.settings(CLIENT_IMPORT_BATCH_SIZE=2):
+                response = self.client.post(reverse("client_import"), {"file": upload})
+            self.assertEqual(response.status_code, 200)
+            self.assertTrue(response.context["form"].errors["file"])
+            self.assertEqual(MailClient.objects.filter(owner=self.user).count(), 1)
+
+    def test_export_streams_csv(self):
+        self.client.login(email="test@example.com", password="testpass123")
+        response = self.client.get(reverse("client_export"))
+        self.assertTrue(response.streaming)
+        content = b"".join(response.streaming_content).decode()
+        self.assertEqual(
+            content.splitlines(), ["email,full_name,comment", "old@example.com,Старый,"]
+        )
+
+
 class FormTests(TestCase):
     def setUp(self):
         self.user = User.objects.create_user(
@@ -248,6 +533,146 @@ class FormTests(TestCase):
         self.assertTrue(form.is_valid())
 
 
+class SegmentTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(
+            username="testuser", email="test@example.com", password="testpass123"
+        )
+        other = User.objects.create_user(
+            username="other", email="other@example.com", password="testpass123"
+        )
+        for email, comment in [
+            ("ivan@gmail.com", "vip"),
+            ("anna@gmail.com", ""),
+            ("petr@yandex.ru", "vip"),
+        ]:
+            MailClient.objects.create(
+                email=email, full_name="Клиент", comment=comment, owner=self.user
+            )
+        MailClient.objects.create(email="alien@gmail.com", full_name="Чужой", owner=other)
+        self.segment = Segment.objects.create(
+            name="Gmail без VIP",
+            rules=[
+                {"field": "email", "lookup": "iendswith", "value": "@gmail.com"},
+                {"field": "comment", "lookup": "exact", "value": "vip", "exclude": True},
+            ],
+            owner=self.user,
+        )
+        self.message = Message.objects.create(subject="Тема", body="Текст", owner=self.user)
+
+    def test_rules_select_only_owner_clients(self):
+        emails = set(self.segment.get_clients().values_list("email", flat=True))
+        self.assertEqual(emails, {"anna@gmail.com"})
+
+    def test_mailing_to_segment_is_resolved_at_send_time(self):
+        mailing = Mailing.objects.create(
+            start_datetime=timezone.now(),
+            periodicity="daily",
+            status="created",
+            message=self.message,
+            segment=self.segment,
+            owner=self.user,
+        )
+        MailClient.objects.create(email="new@gmail.com", full_name="Новый", owner=self.user)
+        list(dispatch_mailing(mailing))
+        self.assertEqual(
+            sorted(message.to[0] for message in mail.outbox), ["anna@gmail.com", "new@gmail.com"]
+        )
+
+    def test_segment_form_rejects_unknown_field(self):
+        form = SegmentForm(
+            data={"name": "Плохой", "rules": '[{"field": "owner__password", "value": "x"}]'}
+        )
+        self.assertFalse(form.is_valid())
+        self.assertIn("rules", form.errors)
+
+    def test_segment_form_rejects_wrong_value_type(self):
+        for rule in [
+            '{"field": "comment", "lookup": "isnull", "value": "yes"}',
+            '{"field": "email", "lookup": "icontains", "value": 5}',
+        ]:
+            form = SegmentForm(data={"name": "Плохой", "rules": f"[{rule}]"})
+            self.assertFalse(form.is_valid())
+            self.assertIn("rules", form.errors)
+        form = SegmentForm(
+            data={
+                "name": "Без комментария",
+                "rules": '[{"field": "comment", "lookup": "isnull", "value": true}]',
+            }
+        )
+        self.assertTrue(form.is_valid())
+
+    def test_mailing_form_requires_audience(self):
+        data = {
+            "start_datetime": timezone.now(),
+            "periodicity": "daily",
+            "status": "created",
+            "message": self.message.id,
+        }
+        self.assertFalse(MailingForm(data=data, user=self.user).is_valid())
+        data["segment"] = self.segment.id
+        self.assertTrue(MailingForm(data=data, user=self.user).is_valid())
+
+    @override_settings(MAILING_FORM_MAX_CLIENTS=2)
+    def test_mailing_form_hides_large_client_list(self):
+        self.assertNotIn("clients", MailingForm(user=self.user).fields)
+
+    @override_settings(MAILING_FORM_MAX_CLIENTS=2)
+    def test_mailing_with_hand_picked_clients_stays_editable(self):
+        mailing = Mailing.objects.create(
+            start_datetime=timezone.now(),
+            periodicity="daily",
+            status="created",
+            message=self.message,
+            owner=self.user,
+        )
+        mailing.clients.add(*MailClient.objects.filter(owner=self.user)[:2])
+        data = {
+            "start_datetime": mailing.start_datetime,
+            "periodicity": "weekly",
+            "status": "completed",
+            "message": self.message.id,
+        }
+        form = MailingForm(data=data, instance=mailing, user=self.user)
+        self.assertTrue(form.is_valid(), form.errors)
+        form.save()
+        self.assertEqual(mailing.clients.count(), 2)
+
+    def test_rescheduled_mailing_without_attempts_starts_at_start_time(self):
+        mailing = Mailing.objects.create(
+            start_datetime=timezone.now() + timedelta(days=1),
+            periodicity="weekly",
+            status="created",
+            message=self.message,
+            owner=self.user,
+            segment=self.segment,
+        )
+        start = (timezone.now() - timedelta(days=2)).replace(microsecond=0)
+        data = {
+            "start_datetime": start,
+            "periodicity": "weekly",
+            "status": "created",
+            "message": self.message.id,
+            "segment": self.segment.id,
+        }
+        form = MailingForm(data=data, instance=mailing, user=self.user)
+        self.assertTrue(form.is_valid(), form.errors)
+        form.save()
+        mailing.refresh_from_db()
+        # Прошедший старт не пропускается до следующей недели: рассылка уходит сразу
+        self.assertEqual(mailing.next_run_at, start)
+        self.assertIn(mailing, get_due_mailings(timezone.now()))
+
+        MailingAttempt.objects.create(mailing=mailing, status="success")
+        data["periodicity"] = "daily"
+        form = MailingForm(data=data, instance=mailing, user=self.user)
+        self.assertTrue(form.is_valid(), form.errors)
+        form.save()
+        mailing.refresh_from_db()
+        self.assertGreater(mailing.next_run_at, timezone.now())
+
+
 class EmailTests(TestCase):
     def setUp(self):
         self.user = User.objects.create_user(
@@ -285,10 +710,736 @@ class EmailTests(TestCase):
             MailingAttempt.objects.filter(mailing=self.mailing, status="success").exists()
         )
 
+    def test_send_mailing_one_message_per_recipient(self):
+        from .tasks import send_mailing
+
+        other = MailClient.objects.create(
+            email="other@example.com", full_name="Other Client", owner=self.user
+        )
+        self.mailing.clients.add(other)
+
+        send_mailing()
+        self.assertEqual(len(mail.outbox), 2)
+        self.assertEqual(
+            sorted(message.to for message in mail.outbox),
+            [["client@example.com"], ["other@example.com"]],
+        )
+
+    def test_delivery_log_per_recipient(self):
+        from .tasks import send_mailing
+
+        send_mailing()
+        delivery = MailingDelivery.objects.get(attempt__mailing=self.mailing)
+        self.assertEqual(delivery.client, self.client)
+        self.assertEqual(delivery.status, "success")
+        self.assertEqual(delivery.smtp_code, 250)
+
+    def test_delivery_log_bulk_insert(self):
+        from .tasks import DeliveryLog
+
+        attempt = MailingAttempt.objects.create(mailing=self.mailing, status="success")
+        delivery_log = DeliveryLog(attempt, chunk_size=100)
+        results = [DeliveryResult(None, f"c{i}@example.com", i % 2 == 0) for i in range(50)]
+        with self.assertNumQueries(1):
+            delivery_log.add(results)
+            delivery_log.flush()
+        self.assertEqual((delivery_log.sent, delivery_log.failed), (25, 25))
+        self.assertEqual(attempt.deliveries.count(), 50)
+
+
+class MailingFixtureMixin:
+    """Пользователь, его сообщение и рассылка — общая основа тестов отправки."""
+
+    subject = "Test Subject"
+    body = "Test Body"
+    periodicity = "daily"
+    # Адреса клиентов рассылки self.mailing; None — рассылка не создаётся
+    mailing_recipients = None
+
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+        self.user = User.objects.create_user(
+            username="testuser", email="test@example.com", password="testpass123"
+        )
+        self.message = Message.objects.create(subject=self.subject, body=self.body, owner=self.user)
+        if self.mailing_recipients is not None:
+            self.mailing = self.create_mailing(
+                self.user, self.mailing_recipients, periodicity=self.periodicity
+            )
+
+    def create_mailing(self, owner, emails=(), **fields):
+        fields = {
+            "start_datetime": timezone.now(),
+            "periodicity": "daily",
+            "status": "created",
+            "message": self.message,
+            **fields,
+        }
+        mailing = Mailing.objects.create(owner=owner, **fields)
+        for email in emails:
+            mailing.clients.add(
+                MailClient.objects.create(email=email, full_name="Client", owner=owner)
+            )
+        return mailing
+
+    def send(self, connection, when=None):
+        """Забирает due-рассылки и отправляет их без лимитов скорости."""
+        claimed = claim_due_mailings(when or timezone.now())
+        run_fair(claimed, connection, Throttle(relay_rate=0, owner_rate=0, relay_rates={}))
+
+
+class DueMailingsTests(MailingFixtureMixin, TestCase):
+    def create_mailings(self, count, periodicity="daily"):
+        for i in range(count):
+            mailing = self.create_mailing(
+                self.user,
+                start_datetime=timezone.now() - timedelta(days=1),
+                periodicity=periodicity,
+            )
+            mailing.clients.add(
+                MailClient.objects.create(
+                    email=f"client{mailing.pk}@example.com", full_name="Client", owner=self.user
+                )
+            )
+            MailingAttempt.objects.create(mailing=mailing, status="success")
+
+    def evaluate_due_mailings(self, now):
+        return [mailing.message.subject for mailing in get_due_mailings(now)]
+
+    def test_query_count_does_not_depend_on_mailing_count(self):
+        later = timezone.now() + timedelta(days=2)
+        self.create_mailings(1)
+        with self.assertNumQueries(1):
+            self.assertEqual(len(self.evaluate_due_mailings(later)), 1)
+        self.create_mailings(10)
+        with self.assertNumQueries(1):
+            self.assertEqual(len(self.evaluate_due_mailings(later)), 11)
+
+    def test_recipients_are_streamed_without_models(self):
+        self.create_mailings(1)
+        mailing = Mailing.objects.get()
+        mailing.clients.add(
+            *(
+                MailClient.objects.create(
+                    email=f"extra{i}@example.com", full_name=f"Extra {i}", owner=self.user
+                )
+                for i in range(4)
+            )
+        )
+        with CaptureQueriesContext(connection) as queries:
+            recipients = list(iter_recipients(mailing, chunk_size=2))
+        self.assertEqual(len(recipients), 5)
+        self.assertIn(("extra0@example.com", "Extra 0"), [row[1:] for row in recipients])
+        # Тяжёлое поле comment из базы не читается
+        self.assertTrue(all("comment" not in query["sql"] for query in queries))
+
+    def test_sent_mailing_is_not_due_until_next_run(self):
+        from .tasks import send_mailing
+
+        self.create_mailings(1, periodicity="weekly")
+        send_mailing()
+        mailing = Mailing.objects.get()
+        self.assertGreater(mailing.next_run_at, timezone.now() + timedelta(days=5))
+        self.assertEqual(get_due_mailings(timezone.now() + timedelta(days=5)).count(), 0)
+        self.assertEqual(get_due_mailings(timezone.now() + timedelta(days=7)).count(), 1)
+
+    def test_claim_advances_next_run(self):
+        self.create_mailings(3)
+        now = timezone.now()
+        claimed = claim_due_mailings(now, limit=2)
+        self.assertEqual(len(claimed), 2)
+        self.assertTrue(all(mailing.next_run_at > now for mailing in claimed))
+        # Уже забранные рассылки не достаются следующему воркеру
+        self.assertEqual(len(claim_due_mailings(now)), 1)
+        self.assertEqual(claim_due_mailings(now), [])
+
+    def test_shards_split_mailings_by_owner(self):
+        from .tasks import send_mailing
+
+        self.create_mailings(2)
+        # Соседний pk — другая чётность, значит и другой из двух шардов
+        other_user = User.objects.create_user(
+            pk=self.user.pk + 1,
+            username="otheruser",
+            email="other@example.com",
+            password="otherpass123",
+        )
+        other_mailing = Mailing.objects.create(
+            start_datetime=timezone.now(),
+            periodicity="daily",
+            status="created",
+            message=self.message,
+            owner=other_user,
+        )
+
+        self.assertEqual(send_mailing(shard=(other_user.pk % 2, 2)), 1)
+        self.assertTrue(MailingAttempt.objects.filter(mailing=other_mailing).exists())
+        self.assertEqual(send_mailing(shard=(self.user.pk % 2, 2)), 2)
+        self.assertEqual(send_mailing(), 0)
+
+    def test_parallel_command_runs_each_shard_once(self):
+        shards = []
+
+        def fake_send_mailing(shard=None):
+            shards.append(shard)
+            return shard[0] + 1
+
+        stdout = io.StringIO()
+        with patch("mailpost.tasks.send_mailing", fake_send_mailing):
+            call_command("send_mailing", workers=3, executor="thread", stdout=stdout)
+        self.assertEqual(sorted(shards), [(0, 3), (1, 3), (2, 3)])
+        self.assertIn("Mailings sent: 6", stdout.getvalue())
+
+    def test_closed_mailing_is_not_due(self):
+        self.create_mailings(1)
+        Mailing.objects.update(status="closed")
+        self.assertEqual(get_due_mailings(timezone.now()).count(), 0)
+
+    def test_monthly_next_occurrence_keeps_day_of_month(self):
+        zone = timezone.get_current_timezone()
+        mailing = Mailing(
+            start_datetime=datetime(2024, 1, 31, 10, 0, tzinfo=zone), periodicity="monthly"
+        )
+        february = mailing.next_occurrence(mailing.start_datetime)
+        self.assertEqual(february, datetime(2024, 2, 29, 10, 0, tzinfo=zone))
+        self.assertEqual(
+            mailing.next_occurrence(february), datetime(2024, 3, 31, 10, 0, tzinfo=zone)
+        )
+
+    def test_daily_next_occurrence_skips_missed_runs(self):
+        zone = timezone.get_current_timezone()
+        mailing = Mailing(
+            start_datetime=datetime(2024, 5, 1, 9, 0, tzinfo=zone), periodicity="daily"
+        )
+        after = datetime(2024, 5, 10, 12, 0, tzinfo=zone)
+        self.assertEqual(mailing.next_occurrence(after), datetime(2024, 5, 11, 9, 0, tzinfo=zone))
+
+
+class SchedulerTests(TestCase):
+    def test_worker_scheduler_runs_send_mailing(self):
+        from .scheduler import create_scheduler, run_job
+        from .tasks import send_mailing
+
+        job = create_scheduler(interval=30).get_job("send_mailing")
+        self.assertEqual(job.func, run_job)
+        self.assertEqual(job.args, (send_mailing,))
+        self.assertEqual(job.trigger.interval, timedelta(seconds=30))
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+        self.sleeps = []
+
+    def __call__(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.sleeps.append(seconds)
+
+
+class ThrottleTests(MailingFixtureMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.clock = FakeClock()
+
+    def test_token_bucket_reserves_in_debt(self):
+        bucket = TokenBucket(rate=10, clock=self.clock)
+        self.assertEqual(bucket.reserve(10), 0)
+        self.assertEqual(bucket.reserve(5), 0.5)
+        self.clock.now = 1.0
+        self.assertEqual(bucket.delay(5), 0)
+        self.assertEqual(bucket.delay(6), 0.1)
+
+    def test_shared_bucket_limits_all_workers_together(self):
+        # Два воркера со своими объектами Throttle делят одно ведро в кэше
+        workers = [
+            Throttle(relay_rate=10, owner_rate=0, relay_rates={}, clock=self.clock, shared=True)
+            for _ in range(2)
+        ]
+        self.assertEqual(workers[0].acquire("relay", 1, 10), 0)
+        self.assertEqual(workers[1].acquire("relay", 2, 10), 1.0)
+        self.assertEqual(workers[0].delay("relay", 1, 5), 2.0)
+        self.clock.now = 2.5
+        self.assertEqual(workers[1].acquire("relay", 2, 5), 0)
+
+        local = [
+            Throttle(relay_rate=10, owner_rate=0, relay_rates={}, clock=self.clock, shared=False)
+            for _ in range(2)
+        ]
+        self.assertEqual([worker.acquire("relay", 1, 10) for worker in local], [0, 0])
+
+    def test_shared_bucket_with_fractional_rate(self):
+        bucket = SharedTokenBucket("test", rate=0.5, clock=self.clock)
+        self.assertEqual((bucket.capacity, bucket.window), (1, 2.0))
+        self.assertEqual([bucket.reserve() for _ in range(3)], [0, 2.0, 4.0])
+
+    def test_shared_bucket_window_outlives_a_minute(self):
+        # Окно 100 с: ключ окна не должен истечь посреди него
+        with patch("time.time", self.clock):
+            bucket = SharedTokenBucket("slow", rate=0.01, clock=self.clock)
+            self.clock.now = 1000
+            self.assertEqual(bucket.reserve(), 0)
+            self.clock.now = 1070
+            self.assertEqual(bucket.reserve(), 30.0)
+
+    def test_shared_bucket_delay_reads_only_head_window(self):
+        bucket = SharedTokenBucket("fast", rate=1, clock=self.clock)
+        bucket.reserve(3)
+        with patch.object(caches["default"], "get", wraps=caches["default"].get) as get:
+            self.assertEqual(bucket.delay(100), 102.0)
+        self.assertLessEqual(get.call_count, 2)
+
+    def test_throttle_waits_for_strictest_limit(self):
+        throttle = Throttle(
+            relay_rate=100,
+            owner_rate=2,
+            relay_rates={"slow-relay": 1},
+            clock=self.clock,
+            sleep=self.clock.sleep,
+        )
+        self.assertEqual(throttle.acquire("relay", 1, 4), 1.0)
+        self.assertEqual(throttle.acquire("slow-relay", 2, 3), 2.0)
+        self.assertEqual(self.clock.sleeps, [1.0, 2.0])
+
+    @override_settings(MAILING_BATCH_SIZE=2)
+    def test_owners_take_turns(self):
+        other_user = User.objects.create_user(
+            username="otheruser", email="other@example.com", password="otherpass123"
+        )
+        big = self.create_mailing(self.user, [f"a{i}@example.com" for i in range(6)])
+        small = self.create_mailing(other_user, ["b0@example.com", "b1@example.com"])
+        throttle = Throttle(relay_rate=0, owner_rate=0, relay_rates={})
+
+        run_fair([big, small], mail.get_connection(), throttle)
+        self.assertEqual([message.to[0][0] for message in mail.outbox], list("aabbaaaa"))
+
+    @override_settings(MAILING_BATCH_SIZE=1)
+    def test_throttle_wait_is_recorded(self):
+        mailing = self.create_mailing(self.user, ["a@example.com", "b@example.com"])
+        throttle = Throttle(
+            relay_rate=0, owner_rate=1, relay_rates={}, clock=self.clock, sleep=self.clock.sleep
+        )
+
+        run_fair([mailing], mail.get_connection(), throttle)
+        waits = MailingDelivery.objects.order_by("pk").values_list("throttle_wait_ms", flat=True)
+        self.assertEqual(list(waits), [0, 1000])
+
+
+class RefusingConnection(locmem.EmailBackend):
+    refused = "bad@example.com"
+    code = 550
+
+    def send_messages(self, messages):
+        for message in messages:
+            if self.refused in message.to:
+                raise smtplib.SMTPRecipientsRefused({self.refused: (self.code, b"Refused")})
+        return super().send_messages(messages)
+
+
+class BusyConnection(RefusingConnection):
+    code = 451
+
+
+class DispatchTests(MailingFixtureMixin, TestCase):
+    mailing_recipients = []
+
+    def test_dispatch_in_batches(self):
+        recipients = [(i, f"client{i}@example.com", "") for i in range(5)]
+        batches = list(dispatch_mailing(self.mailing, recipients, batch_size=2))
+        self.assertEqual([len(batch) for batch in batches], [2, 2, 1])
+        self.assertEqual(len(mail.outbox), 5)
+
+    def test_bad_address_does_not_fail_mailing(self):
+        recipients = [
+            (1, "good@example.com", ""),
+            (2, "bad@example.com", ""),
+            (3, "ok@example.com", ""),
+        ]
+        results = [
+            result
+            for batch in dispatch_mailing(self.mailing, recipients, connection=RefusingConnection())
+            for result in batch
+        ]
+        self.assertEqual([result.success for result in results], [True, False, True])
+        self.assertEqual(results[1].smtp_code, 550)
+        self.assertEqual(len(mail.outbox), 2)
+
+    def test_template_message_is_personalized(self):
+        self.message.subject = "{{ full_name }}, привет"
+        self.message.body = "Письмо для {{ full_name }} <{{ email }}>"
+        self.message.is_template = True
+        recipients = [(1, "ivan@example.com", "Иван"), (2, "anna@example.com", "Анна")]
+        list(dispatch_mailing(self.mailing, recipients))
+        self.assertEqual(mail.outbox[0].subject, "Иван, привет")
+        self.assertEqual(mail.outbox[1].body, "Письмо для Анна <anna@example.com>")
+
+    def test_template_is_compiled_once_per_run(self):
+        self.message.body = "Здравствуйте, {{ full_name }}!"
+        self.message.is_template = True
+        recipients = [(i, f"client{i}@example.com", f"Клиент {i}") for i in range(5)]
+        with patch.object(engine, "from_string", wraps=engine.from_string) as from_string:
+            compile_template.cache_clear()
+            list(dispatch_mailing(self.mailing, recipients))
+        self.assertEqual(from_string.call_count, 2)
+        self.assertEqual(mail.outbox[4].body, "Здравствуйте, Клиент 4!")
+
+    def test_plain_message_is_sent_verbatim(self):
+        self.message.body = "Скидка {{ 50 }}%"
+        self.message.save()
+        list(dispatch_mailing(self.mailing, [(1, "client@example.com", "Иван")]))
+        self.assertEqual(mail.outbox[0].body, "Скидка {{ 50 }}%")
+
+    def test_form_rejects_broken_template(self):
+        form = MessageForm(data={"subject": "Тема", "body": "{% if %}", "is_template": True})
+        self.assertFalse(form.is_valid())
+        self.assertIn("body", form.errors)
+
+
+class MimeCacheTests(MailingFixtureMixin, TestCase):
+    subject = "Новости недели"
+    body = "Текст письма"
+    mailing_recipients = []
+
+    def dispatch_to(self, *emails):
+        recipients = [(i, email, "") for i, email in enumerate(emails)]
+        list(dispatch_mailing(self.mailing, recipients))
+        sent = mail.outbox[-len(emails):]  # fmt: skip
+        return [email_message.message().as_bytes() for email_message in sent]
+
+    def test_payload_is_rendered_once_across_runs(self):
+        with patch("mailpost.mime.render_mime_payload", wraps=render_mime_payload) as render:
+            self.dispatch_to("a@example.com", "b@example.com")
+            self.dispatch_to("c@example.com")
+        self.assertEqual(render.call_count, 1)
+
+    def test_only_envelope_headers_differ(self):
+        first, second = (
+            message_from_bytes(data) for data in self.dispatch_to("a@example.com", "b@example.com")
+        )
+        self.assertEqual((first["To"], second["To"]), ("a@example.com", "b@example.com"))
+        self.assertNotEqual(first["Message-ID"], second["Message-ID"])
+        self.assertEqual(str(make_header(decode_header(first["Subject"]))), "Новости недели")
+        self.assertEqual(first.get_payload(decode=True).decode(), "Текст письма")
+
+    def test_edit_invalidates_payload(self):
+        self.dispatch_to("a@example.com")
+        self.message.body = "Новый текст"
+        self.message.save()
+        data = self.dispatch_to("a@example.com")[0]
+        self.assertEqual(message_from_bytes(data).get_payload(decode=True).decode(), "Новый текст")
+
+
+class RecordingSMTPHandler:
+    def __init__(self):
+        self.envelopes = []
+        self.sessions = 0
+        # Домен получателя -> задержка ответа на DATA в секундах
+        self.delays = {}
+
+    async def handle_EHLO(self, server, session, envelope, hostname, responses):
+        self.sessions += 1
+        session.host_name = hostname
+        return responses
+
+    async def handle_RCPT(self, server, session, envelope, address, rcpt_options):
+        if address.startswith("bad@"):
+            return "550 No such user"
+        envelope.rcpt_tos.append(address)
+        return "250 OK"
+
+    async def handle_DATA(self, server, session, envelope):
+        domain = envelope.rcpt_tos[0].rpartition("@")[2]
+        await asyncio.sleep(self.delays.get(domain, 0))
+        self.envelopes.append(envelope)
+        return "250 Message accepted for delivery"
+
+
+class RetryTests(MailingFixtureMixin, TestCase):
+    periodicity = "monthly"
+    mailing_recipients = ["good@example.com", "bad@example.com"]
+
+    def test_transient_failure_is_queued_for_retry(self):
+        self.send(BusyConnection())
+        retry = DeliveryRetry.objects.get()
+        self.assertEqual(retry.email, "bad@example.com")
+        self.assertGreater(retry.next_retry_at, timezone.now())
+
+    def test_permanent_failure_is_not_retried(self):
+        self.send(RefusingConnection())
+        self.assertFalse(DeliveryRetry.objects.exists())
+
+    def test_retry_sends_only_failed_recipients(self):
+        self.send(BusyConnection())
+        mail.outbox = []
+        later = timezone.now() + timedelta(days=1)
+
+        retry_failed_deliveries(later, mail.get_connection())
+        self.assertEqual([message.to for message in mail.outbox], [["bad@example.com"]])
+        self.assertFalse(DeliveryRetry.objects.exists())
+        self.assertEqual(
+            MailingDelivery.objects.filter(email="bad@example.com", status="success").count(), 1
+        )
+
+    def test_still_failing_retry_backs_off(self):
+        self.send(BusyConnection())
+        later = timezone.now() + timedelta(days=1)
+
+        retry_failed_deliveries(later, BusyConnection())
+        retry = DeliveryRetry.objects.get()
+        self.assertEqual(retry.attempts, 2)
+        self.assertGreater(retry.next_retry_at, later)
+        # До нового срока повтор не забирается
+        self.assertEqual(retry_failed_deliveries(later, BusyConnection()), 0)
+
+    @override_settings(MAILING_RETRY_BASE_DELAY=60, MAILING_RETRY_MAX_DELAY=600)
+    def test_retry_delay_grows_exponentially(self):
+        for attempts, delay in [(1, 60), (2, 120), (3, 240), (10, 600)]:
+            seconds = retry_delay(attempts).total_seconds()
+            self.assertTrue(delay / 2 <= seconds <= delay)
+
+
+class SuppressionTests(MailingFixtureMixin, TestCase):
+    mailing_recipients = ["good@example.com", "bad@example.com"]
+
+    def setUp(self):
+        super().setUp()
+        self.other = User.objects.create_user(
+            username="other", email="other@example.com", password="testpass123"
+        )
+
+    def test_permanent_failure_suppresses_address(self):
+        self.send(RefusingConnection())
+        suppression = Suppression.objects.get()
+        self.assertEqual(
+            (suppression.owner, suppression.email, suppression.reason),
+            (self.user, "bad@example.com", "bounce"),
+        )
+
+        mail.outbox = []
+        self.send(RefusingConnection(), timezone.now() + timedelta(days=1))
+        self.assertEqual([message.to for message in mail.outbox], [["good@example.com"]])
+        self.assertEqual(MailingDelivery.objects.filter(email="bad@example.com").count(), 1)
+
+    def test_transient_failure_does_not_suppress(self):
+        self.send(BusyConnection())
+        self.assertFalse(Suppression.objects.exists())
+
+    def test_global_and_owner_suppressions(self):
+        Suppression.objects.create(email="Good@Example.com")
+        Suppression.objects.create(email="bad@example.com", owner=self.other)
+        suppressions = SuppressionList()
+        with self.assertNumQueries(2):
+            suppressed = suppressions.for_owner(self.user.pk)
+            suppressions.for_owner(self.user.pk)
+        self.assertIn("good@example.com", suppressed)
+        self.assertNotIn("bad@example.com", suppressed)
+        self.assertIn("bad@example.com", suppressions.for_owner(self.other.pk))
+
+    def test_suppressed_retry_is_dropped(self):
+        self.send(BusyConnection())
+        add_unsubscribe(self.user.pk, "bad@example.com")
+        mail.outbox = []
+
+        retry_failed_deliveries(timezone.now() + timedelta(days=1), mail.get_connection())
+        self.assertEqual(mail.outbox, [])
+        self.assertFalse(DeliveryRetry.objects.exists())
+
+    def test_messages_carry_unsubscribe_link(self):
+        self.send(mail.get_connection())
+        message = message_from_bytes(mail.outbox[0].message().as_bytes())
+        url = unsubscribe_url(self.user.pk, message["To"])
+        self.assertEqual(message["List-Unsubscribe"], f"<{url}>")
+
+    def test_unsubscribe_link(self):
+        url = unsubscribe_url(self.user.pk, "Good@Example.com")
+        response = self.client.get(url)
+        self.assertContains(response, "good@example.com")
+        self.assertFalse(Suppression.objects.exists())
+
+        self.client.post(url)
+        self.client.post(url)
+        suppression = Suppression.objects.get()
+        self.assertEqual((suppression.owner, suppression.reason), (self.user, "unsubscribe"))
+        self.assertEqual(self.client.get(url + "x").status_code, 404)
+
+
+class OutboxTests(TestCase):
+    def test_register_queues_verification_email(self):
+        response = self.client.post(
+            reverse("register"),
+            {
+                "username": "newuser",
+                "email": "new@example.com",
+                "password1": "Str0ng-pass-123",
+                "password2": "Str0ng-pass-123",
+            },
+        )
+        self.assertEqual(response.status_code, 302)
+        user = User.objects.get(email="new@example.com")
+        outbox_email = OutboxEmail.objects.get(recipient="new@example.com")
+        self.assertIn(user.verification_token, outbox_email.body)
+        self.assertEqual(len(mail.outbox), 0)
+
+    def test_drain_sends_pending_emails(self):
+        enqueue_email("Subject", "Body", ["a@example.com", "b@example.com"])
+        self.assertEqual(drain_outbox(), 2)
+        self.assertEqual(len(mail.outbox), 2)
+        self.assertEqual(OutboxEmail.objects.filter(status="sent").count(), 2)
+        self.assertEqual(drain_outbox(), 0)
+
+    def test_transient_failure_is_rescheduled(self):
+        enqueue_email("Subject", "Body", ["bad@example.com"])
+        self.assertEqual(drain_outbox(BusyConnection()), 0)
+        outbox_email = OutboxEmail.objects.get()
+        self.assertEqual((outbox_email.status, outbox_email.attempts), ("pending", 1))
+        self.assertGreater(outbox_email.next_attempt_at, timezone.now())
+
+    @override_settings(OUTBOX_LEASE=120)
+    def test_claimed_email_returns_after_short_lease(self):
+        enqueue_email("Subject", "Body", ["a@example.com"])
+        now = timezone.now()
+        # Воркер забрал письмо и упал, не отправив его
+        self.assertEqual(len(claim_outbox(now, 10)), 1)
+        self.assertEqual(claim_outbox(now + timedelta(seconds=60), 10), [])
+        self.assertEqual(len(claim_outbox(now + timedelta(seconds=121), 10)), 1)
+
+
+class LocalSMTPServerMixin:
+    def setUp(self):
+        self.handler = RecordingSMTPHandler()
+        with socket.socket() as probe:
+            probe.bind(("127.0.0.1", 0))
+            self.smtp_port = probe.getsockname()[1]
+        self.controller = Controller(self.handler, hostname="127.0.0.1", port=self.smtp_port)
+        self.controller.start()
+        self.addCleanup(self.controller.stop)
+
+
+class AsyncEmailBackendTests(LocalSMTPServerMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.backend = AsyncEmailBackend(
+            host="127.0.0.1",
+            port=self.smtp_port,
+            username="",
+            password="",
+            use_tls=False,
+            use_ssl=False,
+            concurrency=4,
+            per_host_concurrency=2,
+        )
+
+    def make_messages(self, addresses):
+        return [
+            EmailMessage("Subject", "Body", "sender@example.com", [address])
+            for address in addresses
+        ]
+
+    def test_delivers_every_message(self):
+        addresses = [f"client{i}@example{i % 3}.com" for i in range(20)]
+        with self.backend:
+            self.assertEqual(self.backend.send_messages(self.make_messages(addresses)), 20)
+            self.assertLessEqual(len(self.backend.idle_sessions), 4)
+        received = sorted(envelope.rcpt_tos[0] for envelope in self.handler.envelopes)
+        self.assertEqual(received, sorted(addresses))
+
+    def test_slow_domain_does_not_block_other_domains(self):
+        self.handler.delays["slow.com"] = 0.5
+        slow = [f"client{i}@slow.com" for i in range(4)]
+        fast = [f"client{i}@fast{i % 3}.com" for i in range(12)]
+        with self.backend:
+            self.assertEqual(self.backend.send_messages(self.make_messages(slow + fast)), 16)
+        received = [envelope.rcpt_tos[0] for envelope in self.handler.envelopes]
+        first, last = received[:12], received[12:]
+        # Лишние сессии не ждут медленный домен, а разбирают письма остальных
+        self.assertCountEqual(first, fast)
+        self.assertCountEqual(last, slow)
+
+    def test_dispatch_reports_refused_recipient(self):
+        user = User.objects.create_user(
+            username="testuser", email="test@example.com", password="testpass123"
+        )
+        mailing = Mailing(
+            message=Message(subject="Test Subject", body="Test Body", owner=user), owner=user
+        )
+        recipients = [
+            (1, "good@example.com", ""),
+            (2, "bad@example.com", ""),
+            (3, "ok@example.com", ""),
+        ]
+        with self.backend:
+            results = [
+                result
+                for batch in dispatch_mailing(mailing, recipients, connection=self.backend)
+                for result in batch
+            ]
+        self.assertEqual([result.success for result in results], [True, False, True])
+        self.assertEqual(results[1].smtp_code, 550)
+        self.assertEqual(len(self.handler.envelopes), 2)
+
+
+class SMTPConnectionPoolTests(LocalSMTPServerMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.pool = SMTPConnectionPool(size=2, max_idle=60, max_messages=3)
+        patcher = patch("mailpost.custom_email_backend.connection_pool", self.pool)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.addCleanup(self.pool.clear)
+
+    def send(self, address):
+        backend = CustomEmailBackend(
+            host="127.0.0.1",
+            port=self.smtp_port,
+            username="",
+            password="",
+            use_tls=False,
+            use_ssl=False,
+        )
+        message = EmailMessage("Subject", "Body", "sender@example.com", [address])
+        return backend.send_messages([message])
+
+    def test_backends_reuse_pooled_connection(self):
+        for i in range(3):
+            self.assertEqual(self.send(f"client{i}@example.com"), 1)
+        self.assertEqual(len(self.handler.envelopes), 3)
+        self.assertEqual(self.handler.sessions, 1)
+
+    def test_connection_replaced_after_message_cap(self):
+        for i in range(4):
+            self.send(f"client{i}@example.com")
+        self.assertEqual(self.handler.sessions, 2)
+
+    def test_long_lived_connection_is_replaced_after_message_cap(self):
+        backend = CustomEmailBackend(
+            host="127.0.0.1",
+            port=self.smtp_port,
+            username="",
+            password="",
+            use_tls=False,
+            use_ssl=False,
+        )
+        with backend:
+            for i in range(7):
+                message = EmailMessage("Subject", "Body", "sender@example.com", [f"c{i}@e.com"])
+                self.assertEqual(backend.send_messages([message]), 1)
+        self.assertEqual(len(self.handler.envelopes), 7)
+        self.assertEqual(self.handler.sessions, 3)
+
+    def test_idle_expired_connection_is_replaced(self):
+        self.send("client1@example.com")
+        self.pool.max_idle = 0
+        time.sleep(0.01)
+        self.send("client2@example.com")
+        self.assertEqual(self.handler.sessions, 2)
+
 
 class ManagerTests(TestCase):
 
     def setUp(self):
+        cache.clear()
         self.client = Client()
         self.user = User.objects.create_user(
             username="testuser", email="test@example.com", password="testpass123"
@@ -0,0 +1,192 @@
+import logging
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import cache, caches
+from django.core.cache.backends.memcached import BaseMemcachedCache
+
+logger = logging.getLogger(__name__)
+
+
+class TokenBucket:
+    """
+    Ведро токенов: rate токенов в секунду, не больше capacity про запас.
+
+    reserve() сразу списывает токены, даже в долг, и возвращает, сколько
+    секунд нужно подождать, пока долг не покроется. Так ожидание не держит
+    блокировку и параллельные отправители встают в очередь по порядку.
+    """
+
+    def __init__(self, rate, capacity=None, clock=time.monotonic):
+        self.rate = rate
+        self.capacity = capacity or rate
+        self.tokens = self.capacity
+        self.clock = clock
+        self.updated = clock()
+        self.lock = threading.Lock()
+
+    def _refill(self):
+        now = self.clock()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def delay(self, tokens=1):
+        with self.lock:
+            self._refill()
+            return max(0.0, (tokens - self.tokens) / self.rate)
+
+    def reserve(self, tokens=1):
+        with self.lock:
+            self._refill()
+            self.tokens -= tokens
+            return max(0.0, -self.tokens / self.rate)
+
+
+class SharedTokenBucket:
+    """
+    Ведро токенов, общее для всех процессов и хостов: состояние лежит в кэше.
+
+    Время делится на окна по capacity токенов. reserve() атомарно (cache.incr)
+    занимает места в первом окне, где они есть, а не поместившиеся токены
+    переносит в следующие окна. Ждать нужно до начала окна, куда попал
+    последний токен. В одно окно никогда не попадает больше capacity
+    токенов, поэтому суммарная скорость всех воркеров не превышает rate.
+
+    Часы должны быть общими для воркеров (time.time), а кэш — с атомарным
+    incr: memcached. С locmem лимит действует только внутри процесса.
+    """
+
+    def __init__(self, key, rate, window=None, clock=time.time):
+        window = settings.MAILING_THROTTLE_WINDOW if window is None else window
+        # Ёмкость окна — целое число токенов, а длина окна подгоняется под неё
+        self.capacity = max(1, round(rate * window))
+        self.window = self.capacity / rate
+        self.rate = rate
+        self.key = key
+        self.clock = clock
+
+    def _slot_key(self, slot):
+        return f"{self.key}:{slot}"
+
+    def _first_slot(self, now):
+        # Подсказка: все окна до head уже заполнены, их можно не проверять
+        return max(int(now // self.window), cache.get(f"{self.key}:head", 0))
+
+    def _wait(self, slot, now):
+        return max(0.0, slot * self.window - now)
+
+    def delay(self, tokens=1):
+        """
+        Оценка ожидания без резервирования. Смотрит только первое незаполненное
+        окно, а остаток считает по rate: run_fair() спрашивает её перед каждой
+        пачкой, и обход всех окон стоил бы дороже самой отправки.
+        """
+        now = self.clock()
+        slot = self._first_slot(now)
+        free = self.capacity - cache.get(self._slot_key(slot), 0)
+        if free <= 0:
+            slot, free = slot + 1, self.capacity
+        return self._wait(slot, now) + max(0, tokens - free) / self.rate
+
+    def reserve(self, tokens=1):
+        now = self.clock()
+        slot = start = self._first_slot(now)
+        while True:
+            # Окно живёт до своего конца; при малом rate оно длиннее минуты
+            timeout = self._wait(slot, now) + self.window + 60
+            key = self._slot_key(slot)
+            cache.add(key, 0, timeout)
+            try:
+                taken = cache.incr(key, tokens)
+            except ValueError:
+                # Ключ успел истечь между add и incr
+                cache.add(key, tokens, timeout)
+                taken = tokens
+            overflow = taken - self.capacity
+            if overflow <= 0:
+                break
+            tokens = min(tokens, overflow)
+            slot += 1
+        if slot > start:
+            cache.set(f"{self.key}:head", slot, timeout)
+        return self._wait(slot, now)
+
+
+class Throttle:
+    """
+    Ограничение скорости отправки на SMTP-relay и на владельца рассылки.
+
+    По умолчанию (MAILING_THROTTLE_SHARED) ведра лежат в общем кэше, и лимиты
+    действуют на все процессы и хосты вместе. Иначе у каждого процесса свои
+    ведра, и N воркеров отправляют в N раз быстрее лимита.
+    """
+
+    def __init__(
+        self,
+        relay_rate=None,
+        owner_rate=None,
+        relay_rates=None,
+        clock=None,
+        sleep=None,
+        shared=None,
+    ):
+        self.relay_rate = settings.MAILING_RELAY_RATE if relay_rate is None else relay_rate
+        self.owner_rate = settings.MAILING_OWNER_RATE if owner_rate is None else owner_rate
+        self.relay_rates = settings.MAILING_RELAY_RATES if relay_rates is None else relay_rates
+        self.shared = settings.MAILING_THROTTLE_SHARED if shared is None else shared
+        # Общим ведрам нужны общие для всех хостов часы, а не monotonic процесса
+        self.clock = clock or (time.time if self.shared else time.monotonic)
+        self.sleep = sleep or time.sleep
+        self.lock = threading.Lock()
+        self.buckets = {}
+
+    def _bucket(self, key, rate):
+        if self.shared:
+            name = ":".join(str(part) for part in key)
+            return SharedTokenBucket(f"mailpost:throttle:{name}", rate, clock=self.clock)
+        return TokenBucket(rate, clock=self.clock)
+
+    def _buckets(self, relay, owner_id):
+        limits = [
+            (("relay", relay), self.relay_rates.get(relay, self.relay_rate)),
+            (("owner", owner_id), self.owner_rate),
+        ]
+        with self.lock:
+            for key, rate in limits:
+                if rate and key not in self.buckets:
+                    self.buckets[key] = self._bucket(key, rate)
+            return [self.buckets[key] for key, rate in limits if rate]
+
+    def delay(self, relay, owner_id, tokens=1):
+        """Сколько секунд придётся ждать отправки tokens писем, ничего не списывая."""
+        return max((bucket.delay(tokens) for bucket in self._buckets(relay, owner_id)), default=0)
+
+    def acquire(self, relay, owner_id, tokens=1):
+        """Ждёт квоты на tokens писем и возвращает время ожидания в секундах."""
+        waited = max(
+            (bucket.reserve(tokens) for bucket in self._buckets(relay, owner_id)), default=0
+        )
+        if waited:
+            self.sleep(waited)
+        return waited
+
+
+throttle = None
+
+
+def get_throttle():
+    global throttle
+    if throttle is None:
+        throttle = Throttle()
+        if throttle.shared and not isinstance(caches["default"], BaseMemcachedCache):
+            # У locmem свой кэш в каждом процессе, а incr файлового кэша не атомарен
+            logger.warning(
+                "Mailing rate limits are not shared between workers without memcached; "
+                "set CACHE_BACKEND=memcached when running several workers"
+            )
+    return throttle
+
+
+def relay_name(connection):
+    return getattr(connection, "host", None) or type(connection).__name__
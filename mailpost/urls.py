@@ -6,6 +6,8 @@ urlpatterns = [
     path("", views.home, name="home"),
     path("clients/", views.ClientListView.as_view(), name="client_list"),
     path("clients/create/", views.ClientCreateView.as_view(), name="client_create"),
+    path("clients/export/", views.client_export, name="client_export"),
+    path("clients/import/", views.client_import, name="client_import"),
     path("login/", views.login_view, name="login"),
     path("logout/", views.logout_view, name="logout"),
     path("mailings/", views.MailingListView.as_view(), name="mailing_list"),
@@ -39,7 +41,10 @@ urlpatterns = [
     path("messages/", views.MessageListView.as_view(), name="message_list"),
     path("messages/create/", views.MessageCreateView.as_view(), name="message_create"),
     path("register/", views.register, name="register"),
+    path("segments/", views.SegmentListView.as_view(), name="segment_list"),
+    path("segments/create/", views.SegmentCreateView.as_view(), name="segment_create"),
     path("resend-verification/", views.resend_verification, name="resend_verification"),
     path("send-test-email/", views.send_test_email, name="send_test_email"),
+    path("unsubscribe/<str:token>/", views.unsubscribe, name="unsubscribe"),
     path("verify-email/", views.verify_email, name="verify_email"),
 ]
@@ -1,18 +1,21 @@
+import csv
+import io
 import logging
 
-from django.conf import settings
 from django.contrib import messages
 from django.contrib.auth import authenticate, get_user_model, login
 from django.contrib.auth import logout as auth_logout
 from django.contrib.auth.decorators import login_required, user_passes_test
 from django.contrib.auth.forms import AuthenticationForm
 from django.contrib.auth.mixins import LoginRequiredMixin, UserPassesTestMixin
+from django.core import signing
 from django.core.exceptions import PermissionDenied
-from django.core.mail import send_mail
-from django.http import HttpResponse
+from django.db import transaction
+from django.http import Http404, HttpResponse, StreamingHttpResponse
 from django.shortcuts import get_object_or_404, redirect, render
 from django.urls import reverse_lazy
 from django.views.decorators.cache import never_cache
+from django.views.decorators.csrf import csrf_exempt
 from django.views.decorators.http import require_http_methods
 from django.views.decorators.vary import vary_on_cookie
 from django.views.generic import (
@@ -25,26 +28,50 @@ from django.views.generic import (
     View,
 )
 
+from .client_io import export_rows, import_clients
 from .decorators import verified_email_required
 from .forms import (
     ClientForm,
+    ClientImportForm,
     CustomUserCreationForm,
     EmailVerificationForm,
     MailingForm,
     MessageForm,
+    SegmentForm,
 )
-from .models import Client, Mailing, Message
+from .models import Client, Mailing, Message, Segment
+from .outbox import enqueue_email
+from .pagination import KeysetPaginationMixin, paginate_keyset
 from .permissions import (
     IsManagerMixin,
     IsOwnerOrManagerMixin,
+    SingleObjectCacheMixin,
     VerifiedEmailRequiredMixin,
 )
+from .roles import is_manager
+from .stats import get_home_stats, get_random_posts
+from .suppression import add_unsubscribe, read_unsubscribe_token
 
 User = get_user_model()
 
 
+def mailing_list_queryset():
+    # Только колонки, которые выводят списки рассылок, и без запроса на каждую строку
+    return Mailing.objects.select_related("message", "owner").only(
+        "start_datetime",
+        "periodicity",
+        "status",
+        "message",
+        "message__subject",
+        "owner",
+        "owner__email",
+    )
+
+
 def home(request):
-    return render(request, "home.html")
+    context = get_home_stats()
+    context["random_posts"] = get_random_posts()
+    return render(request, "home.html", context)
 
 
 logger = logging.getLogger(__name__)
@@ -60,23 +87,15 @@ def register(request):
             try:
                 user = form.save(commit=False)
                 user.is_active = True
-                user.save()
+                # Письмо попадает в outbox в той же транзакции, что и пользователь
+                with transaction.atomic():
+                    user.save()
+                    send_verification_email(user)
                 logger.info(f"User created: {user.email}")
-
-                logger.info(f"Attempting to send verification email to {user.email}")
-                if send_verification_email(user):
-                    logger.info(f"Verification email sent successfully to {user.email}")
-                    messages.success(
-                        request,
-                        "Пожалуйста, проверьте электронную почту, чтобы подтвердить аккаунт.",
-                    )
-                else:
-                    logger.warning(f"Failed to send verification email to {user.email}")
-                    messages.warning(
-                        request,
-                        "Аккаунт создан, но мы не смогли отправить письмо с подтверждением.",
-                        "Пожалуйста, не связывайтесь с поддержкой.",
-                    )
+                messages.success(
+                    request,
+                    "Пожалуйста, проверьте электронную почту, чтобы подтвердить аккаунт.",
+                )
 
                 return redirect("login")
             except Exception as e:
@@ -139,33 +158,21 @@ logger = logging.getLogger(__name__)
 
 
 def send_verification_email(user):
-    logger.info(f"Sending verification email to {user.email}")
-    subject = "Подтвердите свой email"
-    message = f"Ваш токен подтверждения: {user.verification_token}"
-    from_email = settings.EMAIL_HOST_USER
-    recipient_list = [user.email]
-
-    try:
-        result = send_mail(subject, message, from_email, recipient_list)
-        logger.info(f"send_mail result: {result}")
-        return True
-    except Exception as e:
-        logger.error(f"Failed to send verification email: {str(e)}", exc_info=True)
-        logger.error(f"Email details: subject={subject}, from={from_email}, to={recipient_list}")
-        return False
+    logger.info(f"Queueing verification email to {user.email}")
+    enqueue_email(
+        "Подтвердите свой email",
+        f"Ваш токен подтверждения: {user.verification_token}",
+        [user.email],
+    )
 
 
 def send_test_email(request):
     subject = "Тестовое письмо из Django"
     message = "Это тестовое письмо, отправленное из приложения Django."
-    from_email = settings.EMAIL_HOST_USER
     recipient_list = ["test@example.com"]  # Замените на ваш email для тестирования
 
-    try:
-        send_mail(subject, message, from_email, recipient_list)
-        return HttpResponse("Test email sent successfully!")
-    except Exception as e:
-        return HttpResponse(f"Failed to send test email. Error: {str(e)}")
+    enqueue_email(subject, message, recipient_list)
+    return HttpResponse("Test email queued for sending!")
 
 
 @login_required
@@ -178,11 +185,9 @@ def client_list(request):
 @verified_email_required
 def client_create(request):
     if request.method == "POST":
-        form = ClientForm(request.POST)
+        form = ClientForm(request.POST, instance=Client(owner=request.user))
         if form.is_valid():
-            client = form.save(commit=False)
-            client.owner = request.user
-            client.save()
+            form.save()
             return redirect("client_list")
     else:
         form = ClientForm()
@@ -213,28 +218,19 @@ def message_create(request):
 @login_required
 def resend_verification(request):
     if not request.user.is_verified:
-        if send_verification_email(request.user):
-            messages.success(
-                request, "Письмо с подтверждением отправлено. Пожалуйста, проверьте вашу почту."
-            )
-        else:
-            messages.error(
-                request,
-                "Не удалось отправить письмо с подтверждением. Пожалуйста, попробуйте позже.",
-            )
+        send_verification_email(request.user)
+        messages.success(
+            request, "Письмо с подтверждением отправлено. Пожалуйста, проверьте вашу почту."
+        )
     else:
         messages.info(request, "Ваш email уже подтвержден.")
     return redirect("home")
 
 
-def is_manager(user):
-    return user.groups.filter(name="Managers").exists()
-
-
 @user_passes_test(is_manager)
 def manager_mailing_list(request):
-    mailings = Mailing.objects.all()
-    return render(request, "manager/mailing_list.html", {"mailings": mailings})
+    page = paginate_keyset(request, mailing_list_queryset(), KeysetPaginationMixin.paginate_by)
+    return render(request, "manager/mailing_list.html", {"mailings": page, "page_obj": page})
 
 
 @user_passes_test(is_manager)
@@ -269,19 +265,22 @@ def logout_view(request):
     return redirect("home")
 
 
-class MailingListView(LoginRequiredMixin, ListView):
+class MailingListView(LoginRequiredMixin, KeysetPaginationMixin, ListView):
     model = Mailing
     template_name = "mailing_list.html"
     context_object_name = "mailings"
 
     def get_queryset(self):
-        if self.request.user.groups.filter(name="Managers").exists():
-            return Mailing.objects.all()
-        return Mailing.objects.filter(owner=self.request.user)
+        if is_manager(self.request.user):
+            return mailing_list_queryset()
+        return mailing_list_queryset().filter(owner=self.request.user)
 
 
-class MailingDetailView(LoginRequiredMixin, UserPassesTestMixin, DetailView):
+class MailingDetailView(
+    LoginRequiredMixin, SingleObjectCacheMixin, UserPassesTestMixin, DetailView
+):
     model = Mailing
+    queryset = Mailing.objects.select_related("message", "owner")
     template_name = "mailing_detail.html"
 
     def test_func(self):
@@ -290,7 +289,7 @@ class MailingDetailView(LoginRequiredMixin, UserPassesTestMixin, DetailView):
         return (
             user.is_authenticated
             and user.is_verified
-            and (user == mailing.owner or user.groups.filter(name="Managers").exists())
+            and (user.pk == mailing.owner_id or is_manager(user))
         )
 
     def handle_no_permission(self):
@@ -305,6 +304,11 @@ class MailingCreateView(LoginRequiredMixin, VerifiedEmailRequiredMixin, CreateVi
     template_name = "mailing_form.html"
     success_url = reverse_lazy("mailing_list")
 
+    def get_form_kwargs(self):
+        kwargs = super().get_form_kwargs()
+        kwargs["user"] = self.request.user
+        return kwargs
+
     def form_valid(self, form):
         form.instance.owner = self.request.user
         return super().form_valid(form)
@@ -325,6 +329,12 @@ class MailingUpdateView(LoginRequiredMixin, IsOwnerOrManagerMixin, UpdateView):
     template_name = "mailing_form.html"
     success_url = reverse_lazy("mailing_list")
 
+    def get_form_kwargs(self):
+        # Менеджер правит чужую рассылку: выбор ограничен клиентами её владельца
+        kwargs = super().get_form_kwargs()
+        kwargs["user"] = self.object.owner
+        return kwargs
+
 
 class MailingDeleteView(LoginRequiredMixin, IsOwnerOrManagerMixin, DeleteView):
     model = Mailing
@@ -362,7 +372,7 @@ class ManagerToggleMailingView(IsManagerMixin, UpdateView):
     success_url = reverse_lazy("mailing_list")
 
 
-class ClientListView(LoginRequiredMixin, ListView):
+class ClientListView(LoginRequiredMixin, KeysetPaginationMixin, ListView):
     model = Client
     template_name = "client_list.html"
     context_object_name = "clients"
@@ -377,12 +387,91 @@ class ClientCreateView(LoginRequiredMixin, VerifiedEmailRequiredMixin, CreateVie
     template_name = "client_form.html"
     success_url = reverse_lazy("client_list")
 
+    def get_form(self, form_class=None):
+        # Владелец нужен уже при валидации: по нему форма ищет дубликаты
+        form = super().get_form(form_class)
+        form.instance.owner = self.request.user
+        return form
+
+
+@login_required
+@verified_email_required
+def client_import(request):
+    if request.method == "POST":
+        form = ClientImportForm(request.POST, request.FILES)
+        if form.is_valid():
+            # Большие файлы Django держит во временном файле; читаем его потоком
+            stream = io.TextIOWrapper(
+                form.cleaned_data["file"].file, encoding="utf-8-sig", newline=""
+            )
+            try:
+                # Ошибка чтения в середине файла откатывает уже добавленные пачки
+                with transaction.atomic():
+                    result = import_clients(request.user, stream)
+            except UnicodeDecodeError:
+                form.add_error(
+                    "file", "Файл должен быть в кодировке UTF-8. Клиенты не импортированы."
+                )
+            except csv.Error as e:
+                form.add_error("file", f"Файл не похож на CSV: {e}. Клиенты не импортированы.")
+            else:
+                messages.success(
+                    request,
+                    f"Добавлено клиентов: {result.created}. Дубликатов: {result.duplicates}. "
+                    f"С ошибками: {result.invalid}.",
+                )
+                for line, error in result.errors[:10]:
+                    messages.warning(request, f"Строка {line}: {error}")
+                return redirect("client_list")
+    else:
+        form = ClientImportForm()
+    return render(request, "client_import.html", {"form": form})
+
+
+@login_required
+def client_export(request):
+    response = StreamingHttpResponse(export_rows(request.user), content_type="text/csv")
+    response["Content-Disposition"] = 'attachment; filename="clients.csv"'
+    return response
+
+
+@csrf_exempt
+@require_http_methods(["GET", "POST"])
+def unsubscribe(request, token):
+    # Ссылка подписана, поэтому входа не требует; POST без CSRF нужен для отписки
+    # в один клик из почтового клиента (List-Unsubscribe-Post)
+    try:
+        owner_id, email = read_unsubscribe_token(token)
+    except signing.BadSignature:
+        raise Http404
+    owner = get_object_or_404(User, pk=owner_id)
+    if request.method == "POST":
+        add_unsubscribe(owner.pk, email)
+        return render(request, "unsubscribe.html", {"email": email, "unsubscribed": True})
+    return render(request, "unsubscribe.html", {"email": email})
+
+
+class SegmentListView(LoginRequiredMixin, KeysetPaginationMixin, ListView):
+    model = Segment
+    template_name = "segment_list.html"
+    context_object_name = "segments"
+
+    def get_queryset(self):
+        return Segment.objects.filter(owner=self.request.user)
+
+
+class SegmentCreateView(LoginRequiredMixin, VerifiedEmailRequiredMixin, CreateView):
+    model = Segment
+    form_class = SegmentForm
+    template_name = "segment_form.html"
+    success_url = reverse_lazy("segment_list")
+
     def form_valid(self, form):
         form.instance.owner = self.request.user
         return super().form_valid(form)
 
 
-class MessageListView(LoginRequiredMixin, ListView):
+class MessageListView(LoginRequiredMixin, KeysetPaginationMixin, ListView):
     model = Message
     template_name = "message_list.html"
     context_object_name = "messages"